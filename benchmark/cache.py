@@ -0,0 +1,65 @@
+'''
+time to simulate sampled training configs through a SimCache, then again with only their colors changed,
+whether the cached motion equals the simulated one, and how many entries a small budget keeps
+'''
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.configs import sample_train_configs
+from phys_sim.cache import SimCache
+from utils.misc import BlenderArgumentParser, random_distinct_colors
+from utils.trace import read_trace
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def run_configs(cache, configs):
+    start = time.time()
+    results = [cache.main(config) for config in configs]
+    return results, time.time() - start
+
+
+def read_motion(config):
+    return read_trace(os.path.join(config.sim.output_dir, "motion.%s" % config.sim.motion_format))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    folder = tempfile.mkdtemp(prefix="sim_cache_")
+    try:
+        cache = SimCache(folder)
+        results, miss_time = run_configs(cache, configs)
+        traces = [read_motion(config) if not result.aborted else None for config, result in zip(configs, results)]
+
+        for config in configs:
+            for entity, color in zip(config.objects + config.occluders, random_distinct_colors(7)):
+                entity.color = color
+            os.remove(os.path.join(config.sim.output_dir, "motion.%s" % config.sim.motion_format))
+        cached, hit_time = run_configs(cache, configs)
+        mismatches = 0
+        for config, result, reference, trace in zip(configs, cached, results, traces):
+            same = result.valid == reference.valid and result.aborted == reference.aborted
+            if trace is not None:
+                new_trace = read_motion(config)
+                same = same and all(np.array_equal(new_trace.arrays[k], v) for k, v in trace.arrays.items())
+            mismatches += not same
+        cache.log()
+
+        small = SimCache(folder, max_bytes=cache.num_bytes // 4)
+        small.evict()
+        small.log()
+    finally:
+        shutil.rmtree(folder)
+    print("| {} misses {:.3f}s, {} hits {:.3f}s, mismatches: {} / {}".format(
+        len(configs), miss_time, len(configs), hit_time, mismatches, len(configs)))
@@ -0,0 +1,80 @@
+'''
+time per step spent recording the motion of scenes with different numbers of bodies,
+as dicts of ObjectManager.get_object_motion converted to a trace at the end, against MotionCapture
+'''
+
+import time
+
+import numpy as np
+import pybullet as p
+
+from benchmark.configs import finalize_config, BENCHMARK_SIM_OUTPUT_FOLDER
+from phys_sim.capture import MotionCapture
+from phys_sim.objects import ObjectManager
+from phys_sim.run_sim import setup_world
+from utils.misc import BlenderArgumentParser
+from utils.trace import MotionTrace, GROUPS, FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_bodies", help="numbers of bodies in a scene", type=int, nargs="+",
+                        default=[2, 7, 15])
+    parser.add_argument("--sim_time", type=float, default=5.)
+    return parser.parse_args()
+
+
+def get_config(num_bodies, sim_time):
+    """Cubes sliding side by side in a row"""
+    objects = [dict(shape="cube", init_pos=(0, 1.5 * i - num_bodies * .75, .5), init_orn=(0, 0, 10 * i),
+                    scale=(.4, .4, .4), init_v=(-.5, 0, 0)) for i in range(num_bodies)]
+    sim = dict(output_dir=BENCHMARK_SIM_OUTPUT_FOLDER, sim_time=sim_time)
+    return finalize_config(dict(case_name="benchmark_capture_%d" % num_bodies, objects=objects, sim=sim))
+
+
+def record_dicts(om, num_steps):
+    record_time = 0.
+    motion = []
+    for i in range(num_steps):
+        start = time.time()
+        motion.append(dict(objects=[om.get_object_motion(obj_id) for obj_id in om.object_ids],
+                           occluders=[], desks=[om.get_desk_motion(desk_id) for desk_id in om.desk_ids]))
+        record_time += time.time() - start
+        p.stepSimulation()
+    start = time.time()
+    trace = MotionTrace.from_motion(om.config.sim.timestep, motion)
+    return trace, record_time, time.time() - start
+
+
+def record_capture(om, num_steps):
+    record_time = 0.
+    capture = MotionCapture(om, num_steps)
+    for i in range(num_steps):
+        start = time.time()
+        capture.record(i, True, False, True)
+        record_time += time.time() - start
+        p.stepSimulation()
+    start = time.time()
+    trace = capture.to_trace(om.config.sim.timestep)
+    return trace, record_time, time.time() - start
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    p.connect(p.DIRECT)
+    for num_bodies in args.num_bodies:
+        config = get_config(num_bodies, args.sim_time)
+        num_steps = int(config.sim.sim_time / config.sim.timestep)
+        traces = []
+        for name, record in [("dicts", record_dicts), ("capture", record_capture)]:
+            p.resetSimulation()
+            setup_world(config.sim)
+            om = ObjectManager(config, config.sim.obj_dir, num_steps)
+            trace, record_time, convert_time = record(om, num_steps)
+            traces.append(trace)
+            print("| {:>2d} bodies, {:<8s} {:6.1f}us per step, {:6.1f}us per step to convert to a trace"
+                  .format(num_bodies, name, record_time / num_steps * 1e6, convert_time / num_steps * 1e6))
+        difference = max([np.abs(traces[0].group(group, field) - traces[1].group(group, field)).max(initial=0)
+                          for group in GROUPS for field in FIELDS])
+        print("| {:>2d} bodies, max difference {}".format(num_bodies, difference))
+    p.disconnect()
@@ -0,0 +1,40 @@
+'''
+sample scene configs for benchmarks, without writing them to the config folder
+'''
+
+import os
+import random
+
+import numpy as np
+from easydict import EasyDict
+
+from dataset.generate_train import get_objects, get_occluders
+from dataset.make_all import update_sim
+from utils.constants import SIM_OUTPUT_FOLDER
+from utils.io import mkdir
+from utils.misc import random_distinct_colors
+
+BENCHMARK_SIM_OUTPUT_FOLDER = mkdir(os.path.join(SIM_OUTPUT_FOLDER, "benchmark"))
+
+
+def finalize_config(config):
+    """Fill in simulation defaults as dataset.make_all does"""
+    config = EasyDict(config)
+    update_sim(config, EasyDict(preview=0, requires_valid=0))
+    return config
+
+
+def sample_train_configs(num, seed=0):
+    """Sample configs from the training distribution of dataset.generate_train"""
+    np.random.seed(seed)
+    random.seed(seed)
+    configs = []
+    for i in range(num):
+        case_name = "benchmark_train_{:05d}".format(i)
+        colors = random_distinct_colors(7)
+        materials = ["rubber"] * 7
+        objects = get_objects(colors, materials)
+        occluders = get_occluders(colors, materials)
+        sim = dict(output_dir=os.path.join(BENCHMARK_SIM_OUTPUT_FOLDER, case_name), sim_time=5.)
+        configs.append(finalize_config(dict(case_name=case_name, objects=objects, occluders=occluders, sim=sim)))
+    return configs
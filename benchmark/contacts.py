@@ -0,0 +1,75 @@
+'''
+steps per second of the simulation loop with three has_collision passes per step,
+against a single contact snapshot per step
+'''
+
+import time
+
+import pybullet as p
+
+from benchmark.configs import sample_train_configs
+from phys_sim.contacts import ContactSnapshot
+from phys_sim.objects import ObjectManager
+from phys_sim.run_sim import setup_world
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def run_case(config, use_snapshot):
+    """Run the simulation loop of run_sim.simulate without recording,
+    return the validity, the number of steps and the time spent in the loop"""
+    p.resetSimulation()
+    setup_world(config.sim)
+    num_steps = int(config.sim.sim_time / config.sim.timestep)
+    om = ObjectManager(config, config.sim.obj_dir, num_steps)
+    valid = True
+    start = time.time()
+    for i in range(num_steps):
+        if use_snapshot:
+            contacts = ContactSnapshot()
+            if om.has_object_event(i) and contacts.has_collision(om.object_ids, om.get_object_locations()):
+                valid = False
+        elif om.has_collision():
+            valid = False
+        for obj_id in om.object_ids:
+            om.set_object_motion(obj_id, i)
+        for link_id in range(om.num_link):
+            om.set_occluder_motion(link_id, i)
+        if not use_snapshot and om.has_collision():
+            valid = False
+        object_motions = [om.get_object_motion(obj_id) for obj_id in om.object_ids]
+        if use_snapshot:
+            if contacts.has_collision(om.object_ids, [m['location'] for m in object_motions]):
+                valid = False
+        elif om.has_collision():
+            valid = False
+        p.stepSimulation()
+    return valid, num_steps, time.time() - start
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    p.connect(p.DIRECT)
+    totals = {False: [0, 0.], True: [0, 0.]}
+    mismatches = 0
+    for config in configs:
+        validity = {}
+        for use_snapshot in (False, True):
+            valid, num_steps, elapsed = run_case(config, use_snapshot)
+            validity[use_snapshot] = valid
+            totals[use_snapshot][0] += num_steps
+            totals[use_snapshot][1] += elapsed
+        if validity[False] != validity[True]:
+            mismatches += 1
+    p.disconnect()
+    for use_snapshot, name in ((False, "has_collision x3"), (True, "contact snapshot")):
+        num_steps, elapsed = totals[use_snapshot]
+        print("| {:<18s} {:8.1f} steps/s".format(name, num_steps / elapsed))
+    print("| validity mismatches: {} / {}".format(mismatches, len(configs)))
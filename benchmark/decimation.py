@@ -0,0 +1,72 @@
+'''
+time to simulate sampled training configs and size of their motion traces when recording every step,
+and when recording only every n-th step as rendered, whether validity stays the same
+and whether the decimated motion equals every n-th step of the full one
+'''
+
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.configs import sample_train_configs
+from phys_sim.session import SimSession
+from utils.misc import BlenderArgumentParser
+from utils.trace import write_trace, GROUPS, FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=50)
+    parser.add_argument("--record_every", help="strides to compare with recording every step", type=int,
+                        nargs="+", default=[4])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def run_configs(configs, record_every, folder):
+    configs = copy.deepcopy(configs)
+    for config in configs:
+        config.sim.record_every = record_every
+    start = time.time()
+    with SimSession() as session:
+        results = [session.simulate(config) for config in configs]
+    elapsed = time.time() - start
+    num_bytes = 0
+    for i, result in enumerate(results):
+        file_name = os.path.join(folder, "{}_{}.npz".format(record_every, i))
+        write_trace(result.motion, file_name)
+        num_bytes += os.path.getsize(file_name)
+    return results, elapsed, num_bytes
+
+
+def log(record_every, results, elapsed, num_bytes):
+    step_time = sum(result.step_time for result in results)
+    print("| every {} steps: {:.3f}s, {:.3f}s stepping, {:.1f}kB of traces".format(
+        record_every, elapsed, step_time, num_bytes / 2 ** 10))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    folder = tempfile.mkdtemp(prefix="decimation_")
+    try:
+        references, elapsed, num_bytes = run_configs(configs, 1, folder)
+        log(1, references, elapsed, num_bytes)
+        for record_every in args.record_every:
+            results, elapsed, num_bytes = run_configs(configs, record_every, folder)
+            log(record_every, results, elapsed, num_bytes)
+            mismatches = 0
+            for result, reference in zip(results, references):
+                same = result.valid == reference.valid and result.motion.record_every == record_every
+                for group in GROUPS:
+                    for field in FIELDS:
+                        same = same and np.array_equal(result.motion.group(group, field),
+                                                       reference.motion.group(group, field)[:, ::record_every])
+                mismatches += not same
+            print("| every {} steps, mismatches: {} / {}".format(record_every, mismatches, len(configs)))
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,81 @@
+'''
+size of motion traces stored as keyframes against every record, for human test cases and sampled training configs,
+the time to decode them, and the largest error of the decoded motion
+'''
+
+import os
+import shutil
+import tempfile
+import time
+
+from benchmark.configs import sample_train_configs
+from benchmark.variants import get_case_configs
+from phys_sim.session import SimSession
+from utils.keyframes import get_error
+from utils.misc import BlenderArgumentParser
+from utils.shape_net import SHAPE_CATEGORY
+from utils.trace import read_trace, write_trace, GROUPS, STORED_FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=50)
+    parser.add_argument("--cases", help="human test cases", type=str, nargs="+",
+                        default=["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"])
+    parser.add_argument("--shapes", help="shapes of each case", type=str, nargs="+", default=["cube", "sphere"])
+    parser.add_argument("--max_errors", type=float, nargs="+", default=[1e-4, 1e-3, 1e-2])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def write_traces(traces, folder, max_error):
+    start = time.time()
+    file_names = []
+    for i, trace in enumerate(traces):
+        file_names.append(os.path.join(folder, "{}_{}.npz".format(max_error, i)))
+        write_trace(trace, file_names[-1], max_error)
+    return file_names, time.time() - start
+
+
+def read_traces(file_names):
+    start = time.time()
+    traces = [read_trace(file_name) for file_name in file_names]
+    return traces, time.time() - start
+
+
+def get_max_error(traces, references):
+    return max(get_error(trace.group(group, field), reference.group(group, field), field == "quaternion")
+               for trace, reference in zip(traces, references) for group in GROUPS for field in STORED_FIELDS)
+
+
+def compare(name, traces, folder, max_errors):
+    file_names, _ = write_traces(traces, folder, None)
+    num_bytes = sum(os.path.getsize(file_name) for file_name in file_names)
+    _, read_time = read_traces(file_names)
+    print("| {}: {} traces, {:.1f}kB, read in {:.1f}ms per trace".format(
+        name, len(traces), num_bytes / 2 ** 10, read_time / len(traces) * 1e3))
+    for max_error in max_errors:
+        file_names, write_time = write_traces(traces, folder, max_error)
+        encoded_bytes = sum(os.path.getsize(file_name) for file_name in file_names)
+        decoded, read_time = read_traces(file_names)
+        print("| {}: max error {:g}, {:.1f}kB, {:.1f}x smaller, encoded in {:.1f}ms and decoded in {:.1f}ms "
+              "per trace, largest error {:.2g}".format(
+                  name, max_error, encoded_bytes / 2 ** 10, num_bytes / encoded_bytes,
+                  write_time / len(traces) * 1e3, read_time / len(traces) * 1e3, get_max_error(decoded, traces)))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    shapes = [shape for shape in args.shapes if shape in SHAPE_CATEGORY]
+    human_configs = [config for case in args.cases for shape in shapes
+                     for config in get_case_configs(case, shape, False)]
+    train_configs = sample_train_configs(args.num_cases, args.seed)
+    with SimSession() as session:
+        human_traces = [result.motion for result in session.run(human_configs)]
+        train_traces = [result.motion for result in session.run(train_configs)]
+    folder = tempfile.mkdtemp(prefix="keyframes_")
+    try:
+        compare("human", human_traces, folder, args.max_errors)
+        compare("train", train_traces, folder, args.max_errors)
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,69 @@
+'''
+largest difference between the occluder motion computed by phys_sim.occluder_motion and the motion
+read back from pybullet after resetJointState, and the time spent on each
+'''
+
+import time
+
+import numpy as np
+import pybullet as p
+
+from benchmark.configs import sample_train_configs, finalize_config, BENCHMARK_SIM_OUTPUT_FOLDER
+from dataset.human.generate_human import generate_config
+from phys_sim.objects import ObjectManager
+from phys_sim.occluder_motion import OccluderMotion
+from phys_sim.run_sim import setup_world
+from utils.misc import BlenderArgumentParser
+from utils.trace import FIELDS
+
+TOLERANCE = 1e-6
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def get_human_configs():
+    configs = []
+    for case in ["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"]:
+        for config in generate_config(case, "cube"):
+            config["sim"]["output_dir"] = BENCHMARK_SIM_OUTPUT_FOLDER
+            configs.append(finalize_config(config))
+    return configs
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed) + get_human_configs()
+    p.connect(p.DIRECT)
+    errors = {field: 0. for field in FIELDS}
+    read_time = compute_time = 0.
+    num_records = 0
+    for config in configs:
+        p.resetSimulation()
+        setup_world(config.sim)
+        num_steps = int(config.sim.sim_time / config.sim.timestep)
+        om = ObjectManager(config, config.sim.obj_dir, num_steps)
+        start = time.time()
+        occluder_motion = OccluderMotion(om.occluder_info, om.joint_patterns)
+        compute_time += time.time() - start
+        for i in range(num_steps):
+            for link_id in range(om.num_link):
+                om.set_occluder_motion(link_id, i)
+                start = time.time()
+                motion = om.read_occluder_motion(link_id)
+                read_time += time.time() - start
+                for field in FIELDS:
+                    error = np.abs(np.subtract(motion[field], getattr(occluder_motion, field)[link_id, i])).max()
+                    errors[field] = max(errors[field], error)
+                num_records += 1
+            # the joints drift under gravity, and are set back at the next step
+            p.stepSimulation()
+    p.disconnect()
+    for field in FIELDS:
+        print("| {:<18s} max error {:.3g}".format(field, errors[field]))
+    print("| {} occluder records, read back {:.3f}s, computed {:.3f}s".format(num_records, read_time, compute_time))
+    print("| {}".format("ok" if max(errors.values()) < TOLERANCE else "FAILED, tolerance is %g" % TOLERANCE))
@@ -0,0 +1,53 @@
+'''
+time to simulate sampled training configs one scene at a time, against packing several scenes in one world,
+and whether packed scenes reproduce the validity and the motion of valid scenes.
+Only scenes that stop at their first collision are packed, so the configs are simulated with early_abort
+'''
+
+import time
+
+import numpy as np
+
+from benchmark.configs import sample_train_configs
+from phys_sim.session import SimSession
+from utils.misc import BlenderArgumentParser
+from utils.trace import GROUPS, FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=60)
+    parser.add_argument("--pack_sizes", help="numbers of scenes packed in one world", type=int, nargs="+",
+                        default=[2, 8, 31])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def run_configs(session, configs, pack_size):
+    start = time.time()
+    results = list(session.run(configs, pack_size=pack_size))
+    return results, time.time() - start
+
+
+def max_difference(result, reference):
+    """Largest difference of any field between the motion of two results"""
+    trace, reference = result.motion, reference.motion
+    return max([np.abs(trace.group(group, field) - reference.group(group, field)).max(initial=0)
+                for group in GROUPS for field in FIELDS])
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    for config in configs:
+        config.sim.early_abort = 1
+    with SimSession() as session:
+        references, elapsed = run_configs(session, configs, 1)
+        print("| {:<12s} {:.3f}s".format("single", elapsed))
+        for pack_size in args.pack_sizes:
+            results, elapsed = run_configs(session, configs, pack_size)
+            mismatches = sum(r.collision_step != ref.collision_step for r, ref in zip(results, references))
+            difference = max([max_difference(r, ref) for r, ref in zip(results, references) if ref.valid],
+                             default=0)
+            print("| {:<12s} {:.3f}s, collision step mismatches: {} / {}, max difference of valid motion: {}"
+                  .format("packs of %d" % pack_size, elapsed, mismatches, len(configs), difference))
@@ -0,0 +1,78 @@
+'''
+throughput of simulating sampled training configs in a SimPool with different numbers of workers,
+against a single SimSession, and whether the pool reproduces the validity of every config.
+Configs that time out in the pool are checked to be skipped by make_all.generate rather than rendered
+'''
+
+import os
+import time
+
+from easydict import EasyDict
+
+from benchmark.configs import sample_train_configs
+from dataset.make_all import generate
+from phys_sim.pool import SimPool
+from phys_sim.session import SimSession
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=100)
+    parser.add_argument("--num_workers", help="numbers of workers to measure", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+class RenderRecorder(object):
+    """Stands in for a RenderWorker, recording the cases it is asked to render"""
+
+    def __init__(self):
+        self.case_names = []
+
+    def render(self, config):
+        self.case_names.append(config.case_name)
+
+
+def count_rendered_timeouts(configs):
+    """Simulate configs with a timeout too short for any to finish, return how many time out
+    and how many of those make_all.generate renders"""
+    recorder = RenderRecorder()
+    args = EasyDict(preview=0, requires_valid=0)
+    with SimPool(1, timeout=1e-3) as pool:
+        results = list(pool.run(configs, save=True))
+    for config, result in zip(configs, results):
+        config = EasyDict(config)
+        config.rendering = EasyDict(motion_file=os.path.join(config.sim.output_dir, "motion.npz"),
+                                    output_dir=config.sim.output_dir)
+        config.video = EasyDict(frame_dir=config.sim.output_dir)
+        generate(config, args, sim_result=result, render_worker=recorder)
+    return sum(result.aborted for result in results), len(recorder.case_names)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    print("| {} cpus".format(os.cpu_count()))
+
+    start = time.time()
+    with SimSession() as session:
+        references = [session.simulate(config) for config in configs]
+    elapsed = time.time() - start
+    print("| {:<12s} {:.3f}s, {:.1f} cases/s".format("session", elapsed, len(configs) / elapsed))
+
+    for num_workers in args.num_workers:
+        # starting the workers is part of the cost of a pool
+        start = time.time()
+        with SimPool(num_workers) as pool:
+            results = list(pool.run(configs))
+            restarts = pool.num_restarts
+        elapsed = time.time() - start
+        mismatches = sum(bool(r.valid) != bool(ref.valid) for r, ref in zip(results, references))
+        print("| {:<12s} {:.3f}s, {:.1f} cases/s, validity mismatches: {} / {}, restarts: {}"
+              .format("%d workers" % num_workers, elapsed, len(configs) / elapsed, mismatches, len(configs),
+                      restarts))
+
+    timeouts, rendered = count_rendered_timeouts(configs[:2])
+    print("| timed out configs: {}, rendered: {}".format(timeouts, rendered))
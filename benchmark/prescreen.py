@@ -0,0 +1,52 @@
+'''
+false positive and false negative rates of phys_sim.prescreen against full simulation
+'''
+
+import time
+
+import pybullet as p
+
+from benchmark.configs import sample_train_configs
+from phys_sim.prescreen import predict_collision
+from phys_sim.run_sim import simulate
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    p.connect(p.DIRECT)
+    # (predicted valid, simulated valid) -> number of configs
+    confusion = {(x, y): 0 for x in (False, True) for y in (False, True)}
+    screen_time = sim_time = 0.
+    for config in configs:
+        start = time.time()
+        predicted = predict_collision(config) is None
+        screen_time += time.time() - start
+
+        p.resetSimulation()
+        config.sim.early_abort = True
+        start = time.time()
+        simulated = simulate(config).valid
+        sim_time += time.time() - start
+        confusion[predicted, simulated] += 1
+    p.disconnect()
+
+    num_valid = confusion[True, True] + confusion[False, True]
+    num_invalid = confusion[True, False] + confusion[False, False]
+    print("| {} configs, {} valid in simulation".format(len(configs), num_valid))
+    print("| rejected by prescreen: {}, catching {:.1%} of invalid configs".format(
+        confusion[False, False] + confusion[False, True], confusion[False, False] / max(num_invalid, 1)))
+    print("| false positives (rejected but valid): {} ({:.1%} of valid configs)".format(
+        confusion[False, True], confusion[False, True] / max(num_valid, 1)))
+    print("| false negatives (passed but invalid): {} ({:.1%} of invalid configs)".format(
+        confusion[True, False], confusion[True, False] / max(num_invalid, 1)))
+    print("| prescreen {:.2f}ms/config, early abort simulation {:.2f}ms/config".format(
+        screen_time / len(configs) * 1000, sim_time / len(configs) * 1000))
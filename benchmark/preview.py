@@ -0,0 +1,76 @@
+'''
+slowdown of simulating sampled training configs with preview images, against without,
+when each image is rendered and saved synchronously as before, when png images are encoded in background threads,
+and when the preview is streamed into a single video
+'''
+
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import imageio
+
+from benchmark.configs import sample_train_configs
+from dataset.make_video import ffmpeg
+from phys_sim.preview import PreviewWriter
+from phys_sim.run_sim import prepare_output
+from phys_sim.session import SimSession
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=5)
+    parser.add_argument("--threads", help="numbers of threads encoding images", type=int, nargs="+",
+                        default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def write_synchronously(writer, step):
+    """Preview as it was saved before, with the segmentation rendered as well and the png encoded in place"""
+    imageio.imsave(writer.get_path(step), writer.camera.take_pic())
+
+
+def run_configs(configs, folder, **preview):
+    configs = copy.deepcopy(configs)
+    for i, config in enumerate(configs):
+        config.sim.output_dir = os.path.join(folder, str(i))
+        config.sim.update(preview)
+        prepare_output(config.sim)
+    start = time.time()
+    with SimSession() as session:
+        for config in configs:
+            session.simulate(config)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = sample_train_configs(args.num_cases, args.seed)
+    folder = tempfile.mkdtemp(prefix="preview_")
+    try:
+        off_time = run_configs(configs, folder, preview=0)
+        print("| preview off: {:.3f}s".format(off_time))
+        timings = []
+        write = PreviewWriter.write
+        PreviewWriter.write = write_synchronously
+        try:
+            timings.append(("synchronous png", run_configs(configs, folder, preview=1)))
+        finally:
+            PreviewWriter.write = write
+        for num_threads in args.threads:
+            timings.append(("png, {} threads".format(num_threads),
+                            run_configs(configs, folder, preview=1, preview_threads=num_threads)))
+        timings.append(("png with depth and segmentation",
+                        run_configs(configs, folder, preview=1, preview_passes=1)))
+        if shutil.which(ffmpeg) is not None:
+            timings.append(("video", run_configs(configs, folder, preview=1, preview_video=1)))
+        else:
+            print("| {} not found, skipping the preview video".format(ffmpeg))
+        for name, elapsed in timings:
+            print("| {}: {:.3f}s, {:.2f}x slower than without preview".format(name, elapsed, elapsed / off_time))
+    finally:
+        shutil.rmtree(folder)
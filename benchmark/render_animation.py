@@ -0,0 +1,59 @@
+'''
+time per rendered frame of a sampled training case, with a render call for each frame as before against
+a single animation render with persistent data, and whether both write the same files, run in Blender
+'''
+
+import copy
+import os
+import shutil
+import tempfile
+
+from easydict import EasyDict
+
+from benchmark.configs import sample_train_configs
+from dataset.make_all import update_render
+from phys_sim import run_sim
+from render.run_render import iter_frames
+from render.worker import RenderWorker
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--samples", help="samples per pixel, the default of update_render if not given",
+                        type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def list_outputs(output_dir):
+    return sorted(os.path.join(folder, name) for folder in ['imgs', 'masks', 'depths', 'flows']
+                  for name in os.listdir(os.path.join(output_dir, folder)))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = sample_train_configs(1, args.seed)[0]
+    folder = tempfile.mkdtemp(prefix="render_animation_")
+    config.sim.output_dir = os.path.join(folder, "sim")
+    try:
+        run_sim.main(config)
+        motion_file = os.path.join(config.sim.output_dir, "motion.npz")
+        num_frames = sum(len(frames) for _, frames in iter_frames(motion_file, 25))
+        worker = RenderWorker()
+        outputs = []
+        for animation in (0, 1):
+            case = copy.deepcopy(config)
+            case.rendering = EasyDict(motion_file=motion_file, output_dir=os.path.join(folder, str(animation)))
+            update_render(case, EasyDict(render_animation=animation))
+            if args.samples is not None:
+                case.rendering.render_num_samples = args.samples
+            sampling_time = worker.sampling_time
+            worker.render(case)
+            outputs.append(list_outputs(case.rendering.output_dir))
+            print("| {}: {:.3f}s per frame over {} frames".format(
+                "animation render" if animation else "render per frame",
+                (worker.sampling_time - sampling_time) / num_frames, num_frames))
+        print("| same files: {}".format(outputs[0] == outputs[1]))
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,93 @@
+'''
+time to keyframe the motion of the longest human test case in Blender, with keyframe_insert for each object
+at each frame as before against F-curves filled at once, and whether both give the same keyframes, run in Blender
+'''
+
+import os
+import shutil
+import tempfile
+import time
+
+import bpy
+import numpy as np
+from easydict import EasyDict
+
+from benchmark.variants import get_case_configs
+from phys_sim import run_sim
+from render.objects import ObjectManager
+from render.run_render import iter_frames, load_motion
+from render.worker import RenderWorker
+from utils.misc import BlenderArgumentParser
+from utils.shape_net import SHAPE_CATEGORY
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--cases", help="human test cases", type=str, nargs="+",
+                        default=["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"])
+    parser.add_argument("--shapes", help="shapes of each case", type=str, nargs="+", default=["cube", "sphere"])
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def insert_keyframes(om, motion_file, fps):
+    """Keyframe the objects one frame at a time, as run_render used to"""
+    for chunk, frames in iter_frames(motion_file, fps):
+        locations = chunk.entities("location")
+        quaternions = chunk.entities("quaternion")
+        for k, n in frames:
+            bpy.context.scene.frame_set(n)
+            for i in range(len(locations)):
+                om.set_position(om.obj_names[i], locations[i, k], quaternions[i, k], key_frame=True,
+                                rotation_mode='QUATERNION')
+
+
+def get_keyframes(om):
+    keyframes = {}
+    for name in om.obj_names:
+        action = bpy.data.objects[name].animation_data.action
+        for fcurve in action.fcurves:
+            keyframes[name, fcurve.data_path, fcurve.array_index] = [tuple(point.co) for point in
+                                                                    fcurve.keyframe_points]
+    return keyframes
+
+
+def measure(worker, rendering, config, load, repeats):
+    times = []
+    for _ in range(repeats):
+        om = ObjectManager(config, rendering.shape_dir, rendering.material_dir, rendering.back_wall,
+                           library=worker.library)
+        start = time.time()
+        load(om, config.rendering.motion_file, rendering.fps)
+        times.append(time.time() - start)
+        keyframes = get_keyframes(om)
+        worker.clear()
+    return np.median(times), keyframes
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    configs = [config for case in args.cases for shape in args.shapes if shape in SHAPE_CATEGORY
+               for config in get_case_configs(case, shape, False)]
+    config = max(configs, key=lambda config: (config.sim.sim_time, len(config.objects)))
+    folder = tempfile.mkdtemp(prefix="render_keyframes_")
+    config.sim.output_dir = folder
+    config.rendering.motion_file = os.path.join(folder, "motion.npz")
+    rendering = EasyDict(base_scene_blendfile='render/data/base_scene.blend', material_dir='render/data/materials',
+                         shape_dir='render/data/shapes', template_blendfile='render/data/template.blend',
+                         back_wall=1, fps=25)
+    try:
+        run_sim.main(config)
+        worker = RenderWorker()
+        worker.setup(rendering)
+        insert_time, inserted = measure(worker, rendering, config, insert_keyframes, args.repeats)
+        bulk_time, loaded = measure(worker, rendering, config, load_motion, args.repeats)
+        num_frames = sum(len(frames) for _, frames in iter_frames(config.rendering.motion_file, rendering.fps))
+        print("| {}: {} entities, {} frames".format(config.case_name, len(config.objects) + len(config.occluders),
+                                                   num_frames))
+        print("| keyframe_insert per frame: {:.3f}s".format(insert_time))
+        print("| F-curves at once: {:.3f}s, {:.1f}x faster".format(bulk_time, insert_time / bulk_time))
+        same = inserted.keys() == loaded.keys() and all(np.allclose(inserted[key], loaded[key]) for key in inserted)
+        print("| same keyframes: {}".format(same))
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,92 @@
+'''
+time to add the objects of a scene in Blender, when each is appended from its .blend file as before
+against when it is a copy of a mesh from the shape library, for sampled training scenes of 7 objects,
+the human test cases and scenes of 7 objects with 4 desks, run in Blender
+'''
+
+import os
+import time
+
+import numpy as np
+import bpy
+from easydict import EasyDict
+
+from benchmark.configs import sample_train_configs
+from benchmark.scene_build import get_scene_config
+from benchmark.variants import get_case_configs
+from render.objects import ObjectManager
+from render.shapes import ShapeLibrary
+from render.worker import RenderWorker
+from utils.misc import BlenderArgumentParser, random_distinct_colors
+from utils.shape_net import SHAPE_CATEGORY
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=20)
+    parser.add_argument("--shapes", help="shapes of the human test cases", type=str, nargs="+",
+                        default=["cube", "sphere"])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+class AppendedShapes(ShapeLibrary):
+    """Append every object from its .blend file, naming it after scanning the scene, as ObjectManager used to"""
+
+    def new_object(self, shape, name, scale):
+        sum(obj.name.startswith(shape) for obj in bpy.data.objects)
+        bpy.ops.wm.append(filename=os.path.join(self.get_blend(shape), 'Object', shape))
+        obj = bpy.data.objects[shape]
+        obj.name = name
+        bpy.context.view_layer.objects.active = obj
+        bpy.ops.transform.resize(value=scale)
+        # material slot of the mesh, which ObjectManager links to the object
+        obj.data.materials.append(None)
+        return obj
+
+
+def get_desk_configs(num):
+    configs = []
+    for _ in range(num):
+        config = get_scene_config()
+        colors = random_distinct_colors(7)
+        for params, color in zip(config.objects, colors):
+            params.update(color=color, material="rubber")
+        for params in config.occluders + config.desks:
+            params.update(color="brown", material="rubber")
+        configs.append(config)
+    return configs
+
+
+def measure(worker, rendering, configs, make_library):
+    """Median time to add the objects of a config, with the objects of each removed before the next"""
+    times = []
+    for config in configs:
+        library = make_library()
+        start = time.time()
+        ObjectManager(config, rendering.shape_dir, rendering.material_dir, rendering.back_wall, library=library)
+        times.append(time.time() - start)
+        worker.clear()
+    return np.median(times)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    rendering = EasyDict(base_scene_blendfile='render/data/base_scene.blend', material_dir='render/data/materials',
+                         shape_dir='render/data/shapes', template_blendfile='render/data/template.blend',
+                         back_wall=1)
+    sources = [("training", sample_train_configs(args.num_cases, args.seed)),
+               ("human", [config for shape in args.shapes if shape in SHAPE_CATEGORY
+                          for case in ["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"]
+                          for config in get_case_configs(case, shape, False)]),
+               ("desks", get_desk_configs(args.num_cases))]
+    worker = RenderWorker()
+    worker.setup(rendering)
+    kept = ShapeLibrary(rendering.shape_dir)
+    variants = [("appended", lambda: AppendedShapes(rendering.shape_dir)),
+                ("library per scene", lambda: ShapeLibrary(rendering.shape_dir)),
+                ("library per session", lambda: kept)]
+    for source, configs in sources:
+        for name, make_library in variants:
+            print("| {:<8s} {:<19s} {:.1f}ms per scene".format(
+                source, name, measure(worker, rendering, configs, make_library) * 1000))
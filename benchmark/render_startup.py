@@ -0,0 +1,44 @@
+'''
+time to set up the scene of a case before its objects are added, when it is built from the base scene
+against when it is opened from the template .blend, run in Blender
+'''
+
+import os
+import shutil
+import tempfile
+import time
+
+from easydict import EasyDict
+
+from render.data.builder.make_template import make_template
+from render.run_render import build_scene, load_scene
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--repeats", help="number of cases set up by each path", type=int, default=10)
+    return parser.parse_args()
+
+
+def measure(function, rendering, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        function(rendering)
+    return (time.time() - start) / repeats
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    folder = tempfile.mkdtemp(prefix="render_startup_")
+    rendering = EasyDict(base_scene_blendfile='render/data/base_scene.blend', material_dir='render/data/materials',
+                         template_blendfile=os.path.join(folder, "template.blend"))
+    try:
+        build_time = measure(build_scene, rendering, args.repeats)
+        make_template(rendering, rendering.template_blendfile)
+        load_time = measure(load_scene, rendering, args.repeats)
+        print("| built from the base scene: {:.3f}s per case".format(build_time))
+        print("| opened from the template: {:.3f}s per case, {:.2f}x faster".format(
+            load_time, build_time / load_time))
+    finally:
+        shutil.rmtree(folder)
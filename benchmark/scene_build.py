@@ -0,0 +1,60 @@
+'''
+time to build a scene with 7 objects and 4 desks, with and without cached collision shapes
+'''
+
+import time
+
+import numpy as np
+import pybullet as p
+
+from benchmark.configs import finalize_config
+from phys_sim.objects import ObjectManager
+from phys_sim.run_sim import setup_world
+from phys_sim.shapes import CollisionShapeFactory
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--repeats", help="number of scenes built for each variant", type=int, default=200)
+    return parser.parse_args()
+
+
+class UncachedShapeFactory(CollisionShapeFactory):
+    """Create a new mesh for every object, as ObjectManager used to"""
+
+    def get(self, shape, scale, frame_position=(0, 0, 0)):
+        self.shape_ids = {}
+        return super(UncachedShapeFactory, self).get(shape, scale, frame_position)
+
+
+def get_scene_config():
+    shapes = ["cube", "sphere", "cylinder", "cone", "bowling_pin", "truck", "cube"]
+    objects = [dict(shape=shape, scale=[.3, .3, .3], init_pos=[-1.5 + .5 * i, 3, .3], init_v=[0, -1, 0])
+               for i, shape in enumerate(shapes)]
+    desks = [dict(init_pos=[-2 + 1.5 * i, -3, 0], init_orn=[0, 0, 0], scale=[.5, .4, .2]) for i in range(4)]
+    occluders = [dict(shape="cube", joint="revolute", init_pos=[.2, 0, 0], init_orn=[0, 0, 10],
+                      scale=[.04, 1., .8], joint_pattern=[[90, 0, 250], [0, 90, 250]])]
+    return finalize_config(dict(case_name="benchmark_scene_build", objects=objects, desks=desks,
+                                occluders=occluders, sim=dict(output_dir="", sim_time=5.)))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = get_scene_config()
+    num_steps = int(config.sim.sim_time / config.sim.timestep)
+    p.connect(p.DIRECT)
+    variants = [("uncached mesh", lambda: UncachedShapeFactory(config.sim.obj_dir)),
+                ("cached mesh", lambda: CollisionShapeFactory(config.sim.obj_dir)),
+                ("cached primitives", lambda: CollisionShapeFactory(config.sim.obj_dir, use_primitives=True))]
+    for name, make_factory in variants:
+        times = []
+        for _ in range(args.repeats):
+            p.resetSimulation()
+            setup_world(config.sim)
+            start = time.time()
+            om = ObjectManager(config, config.sim.obj_dir, num_steps, shapes=make_factory())
+            times.append(time.time() - start)
+        print("| {:<18s} {:.3f}ms per scene, {} collision shapes".format(name, np.median(times) * 1000,
+                                                                        om.shapes.num_created))
+    p.disconnect()
@@ -0,0 +1,80 @@
+'''
+peak memory of simulating and reading scenes of increasing length, with the motion written at once
+against written in chunks while stepping and read one chunk at a time, and whether both give the same motion
+'''
+
+import copy
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmark.configs import sample_train_configs
+from phys_sim import run_sim
+from utils.misc import BlenderArgumentParser
+from utils.trace import read_trace, iter_trace, GROUPS, FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--sim_times", help="lengths of the scene in seconds", type=float, nargs="+",
+                        default=[5., 20., 80.])
+    parser.add_argument("--motion_chunk", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def measure(function, *args):
+    """Value, time and peak of traced memory of a call, timed in a separate call without tracing"""
+    start = time.time()
+    function(*args)
+    elapsed = time.time() - start
+    tracemalloc.start()
+    value = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, elapsed, peak
+
+
+def simulate(config, motion_chunk, folder):
+    config = copy.deepcopy(config)
+    config.sim.output_dir = os.path.join(folder, str(motion_chunk))
+    config.sim.motion_chunk = motion_chunk
+    _, elapsed, peak = measure(run_sim.main, config)
+    return os.path.join(config.sim.output_dir, "motion.npz"), elapsed, peak
+
+
+def read_chunks(file_name):
+    """Read the motion as run_render does, with the arrays of one chunk at a time"""
+    for chunk in iter_trace(file_name):
+        chunk.entities("location"), chunk.entities("quaternion")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = sample_train_configs(1, args.seed)[0]
+    # joint patterns of occluders are sampled for the length of training scenes
+    config.occluders = []
+    folder = tempfile.mkdtemp(prefix="streaming_")
+    try:
+        for sim_time in args.sim_times:
+            config.sim.sim_time = sim_time
+            files = []
+            for motion_chunk in (0, args.motion_chunk):
+                file_name, sim_time_taken, sim_peak = simulate(config, motion_chunk, folder)
+                files.append(file_name)
+                reader = read_chunks if motion_chunk > 0 else read_trace
+                _, read_time, read_peak = measure(reader, file_name)
+                print("| {:5.1f}s scene, chunks of {:>3d}: simulated in {:.3f}s with a peak of {:.2f}MB, "
+                      "read in {:.1f}ms with a peak of {:.2f}MB, {:.1f}kB file".format(
+                          sim_time, motion_chunk, sim_time_taken, sim_peak / 2 ** 20, read_time * 1e3,
+                          read_peak / 2 ** 20, os.path.getsize(file_name) / 2 ** 10))
+            trace, chunked = read_trace(files[0]), read_trace(files[1])
+            same = all(np.array_equal(trace.group(group, field), chunked.group(group, field))
+                       for group in GROUPS for field in FIELDS)
+            print("| {:5.1f}s scene, same motion: {}".format(sim_time, same))
+    finally:
+        shutil.rmtree(folder)
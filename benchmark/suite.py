@@ -0,0 +1,189 @@
+'''
+simulation throughput of run_sim.main on sampled training configs, on every human test case type,
+and on synthetic scenes of 1 to 30 objects and 1 to 4 occluders and desks, with the time spent in each phase
+of stepping and the peak memory of each source, written as json to compare across commits
+'''
+
+import copy
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pybullet as p
+
+from benchmark.configs import BENCHMARK_SIM_OUTPUT_FOLDER, finalize_config, sample_train_configs
+from benchmark.variants import get_case_configs
+from phys_sim import run_sim
+from phys_sim.capture import MotionCapture
+from phys_sim.contacts import ContactSnapshot
+from phys_sim.objects import ObjectManager
+from utils.misc import BlenderArgumentParser
+from utils.shape_net import SHAPE_CATEGORY
+
+# functions whose time counts towards each phase
+PHASES = dict(setup=[(run_sim, "setup_world"), (ObjectManager, "__init__")],
+              joint_reset=[(ObjectManager, "set_occluder_motion")],
+              state_capture=[(MotionCapture, "record")],
+              collision_check=[(ContactSnapshot, "__init__"), (ContactSnapshot, "colliding_bodies")],
+              step_simulation=[(p, "stepSimulation")],
+              serialisation=[(MotionCapture, "to_trace"), (run_sim, "write_trace")])
+SCALING = [(1, 1, 1), (5, 1, 1), (10, 1, 1), (20, 1, 1), (30, 1, 1),
+           (10, 2, 2), (10, 3, 3), (10, 4, 4)]
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--num_cases", help="number of sampled training configs", type=int, default=50)
+    parser.add_argument("--cases", help="human test cases", type=str, nargs="+",
+                        default=["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"])
+    parser.add_argument("--shapes", help="shapes of each case", type=str, nargs="+", default=["cube", "sphere"])
+    parser.add_argument("--sources", type=str, nargs="+", default=["train", "human", "synthetic"])
+    parser.add_argument("--output", help="json file of the results",
+                        default=os.path.join(BENCHMARK_SIM_OUTPUT_FOLDER, "suite.json"))
+    parser.add_argument("--compare", help="json file of earlier results to compare with", type=str)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+class PhaseTimer(object):
+    """Total time spent in the functions of each phase, which are wrapped while the timer is entered"""
+
+    def __init__(self, phases):
+        self.phases = phases
+        self.times = defaultdict(float)
+        self.originals = []
+
+    def wrap(self, phase, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.times[phase] += time.perf_counter() - start
+        return timed
+
+    def __enter__(self):
+        for phase, functions in self.phases.items():
+            for owner, name in functions:
+                function = getattr(owner, name)
+                self.originals.append((owner, name, function))
+                setattr(owner, name, self.wrap(phase, function))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for owner, name, function in reversed(self.originals):
+            setattr(owner, name, function)
+        self.originals = []
+
+
+def get_synthetic_config(num_objects, num_occluders, num_desks, sim_time=5.):
+    """Cubes sliding towards the camera from a grid, occluders turning down and up in a row behind them,
+    and desks in a row in front of them"""
+    num_steps = int(sim_time / .01)
+    objects = [dict(shape="cube", init_pos=(-2.5 + .6 * (i // 10), -3.6 + .8 * (i % 10), .2), init_orn=(0, 0, 0),
+                    scale=(.2, .2, .2), init_v=(.3, 0, 0)) for i in range(num_objects)]
+    occluders = [dict(shape="cube", joint="revolute", init_pos=(-.5, -3 + 2 * i, 0), init_orn=(0, 0, 0),
+                      scale=(.05, .6, .6), joint_pattern=[(0, 90, num_steps // 2), (90, 0, num_steps - num_steps // 2)])
+                 for i in range(num_occluders)]
+    desks = [dict(init_pos=(1.5, -3 + 2 * i, 0), init_orn=[0, 0, 0], scale=(.5, .5, .2)) for i in range(num_desks)]
+    case_name = "benchmark_synthetic_{}_{}_{}".format(num_objects, num_occluders, num_desks)
+    sim = dict(output_dir=BENCHMARK_SIM_OUTPUT_FOLDER, sim_time=sim_time)
+    return finalize_config(dict(case_name=case_name, objects=objects, occluders=occluders, desks=desks, sim=sim))
+
+
+def get_configs(source, args):
+    if source == "train":
+        return sample_train_configs(args.num_cases, args.seed)
+    if source == "human":
+        shapes = [shape for shape in args.shapes if shape in SHAPE_CATEGORY]
+        return [config for case in args.cases for shape in shapes for config in get_case_configs(case, shape, False)]
+    if source == "synthetic":
+        return [get_synthetic_config(*counts) for counts in SCALING]
+    raise KeyError(source)
+
+
+def run_source(configs, conn):
+    """Run the configs one by one with run_sim.main, and send the timings and the peak memory of the process"""
+    folder = tempfile.mkdtemp(prefix="suite_")
+    scenes = []
+    with PhaseTimer(PHASES) as timer:
+        for i, config in enumerate(configs):
+            config = copy.deepcopy(config)
+            config.sim.output_dir = os.path.join(folder, str(i))
+            start = time.perf_counter()
+            result = run_sim.main(config)
+            elapsed = time.perf_counter() - start
+            scenes.append(dict(case_name=config.case_name, objects=len(config.get("objects", [])),
+                               occluders=len(config.get("occluders", [])), desks=len(config.get("desks", [])),
+                               steps=result.steps_run, seconds=elapsed, steps_per_sec=result.steps_run / elapsed))
+        phases = dict(timer.times)
+    shutil.rmtree(folder)
+    steps = sum(scene["steps"] for scene in scenes)
+    seconds = sum(scene["seconds"] for scene in scenes)
+    phases["other"] = seconds - sum(phases.values())
+    conn.send(dict(configs=len(configs), steps=steps, seconds=seconds, steps_per_sec=steps / seconds,
+                   phases=phases, peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10,
+                   scenes=scenes))
+    conn.close()
+
+
+def run_isolated(configs):
+    """Results of run_source in a forked process, so that its peak memory is its own"""
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=run_source, args=(configs, child_conn))
+    process.start()
+    results = parent_conn.recv()
+    process.join()
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def log(source, results, previous=None):
+    phases = ", ".join("{} {:.1%}".format(phase, seconds / results["seconds"])
+                       for phase, seconds in results["phases"].items())
+    print("| {}: {} configs, {} steps in {:.3f}s, {:.0f} steps/s, peak RSS {:.1f}MB".format(
+        source, results["configs"], results["steps"], results["seconds"], results["steps_per_sec"],
+        results["peak_rss_mb"]))
+    print("| {}: {}".format(source, phases))
+    if previous is not None:
+        print("| {}: {:.2f}x the steps/s of {}".format(
+            source, results["steps_per_sec"] / previous["steps_per_sec"], previous.get("commit")))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    previous = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report = dict(commit=get_commit(), time=time.strftime("%Y-%m-%d %H:%M:%S"), python=platform.python_version(),
+                  numpy=np.__version__, cpus=os.cpu_count(), sources={})
+    for source in args.sources:
+        report["sources"][source] = run_isolated(get_configs(source, args))
+        if source == "synthetic":
+            for scene in report["sources"][source]["scenes"]:
+                print("| synthetic: {} objects, {} occluders, {} desks, {:.0f} steps/s".format(
+                    scene["objects"], scene["occluders"], scene["desks"], scene["steps_per_sec"]))
+        compared = None
+        if previous is not None and source in previous["sources"]:
+            compared = dict(previous["sources"][source], commit=previous["commit"])
+        log(source, report["sources"][source], compared)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print("| results written to {}".format(args.output))
@@ -0,0 +1,70 @@
+'''
+time to simulate the variants of human test cases one at a time, against sharing the steps they have in common,
+and whether shared simulation reproduces the motion of every variant exactly.
+Each case also gets a copy of its first variant that ends earlier, which branches at its last step
+'''
+
+import copy
+import time
+
+import numpy as np
+
+from benchmark.configs import BENCHMARK_SIM_OUTPUT_FOLDER, finalize_config
+from dataset.human.generate_human import generate_config
+from phys_sim.session import SimSession
+from phys_sim.variants import simulate_variants
+from utils.misc import BlenderArgumentParser
+from utils.shape_net import SHAPE_CATEGORY
+from utils.trace import GROUPS, FIELDS
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument("--cases", help="human test cases", type=str, nargs="+",
+                        default=["disappear", "disappear_fixed", "overturn", "discontinuous", "block", "delay"])
+    parser.add_argument("--shapes", help="shapes of each case", type=str, nargs="+", default=["cube", "sphere"])
+    parser.add_argument("--early_abort", type=int, default=0)
+    return parser.parse_args()
+
+
+def get_case_configs(case, shape, early_abort):
+    configs = []
+    for config in generate_config(case, shape):
+        config["sim"]["output_dir"] = BENCHMARK_SIM_OUTPUT_FOLDER
+        config = finalize_config(config)
+        config.sim.early_abort = early_abort
+        configs.append(config)
+    return configs
+
+
+def add_shorter_variant(configs):
+    """Append a copy of the first variant with half its sim_time, so that it is not the lead of the case"""
+    config = copy.deepcopy(configs[0])
+    config.case_name += "_shorter"
+    config.sim.sim_time /= 2
+    return configs + [config]
+
+
+def is_identical(result, reference):
+    if result.aborted != reference.aborted or result.collision_step != reference.collision_step:
+        return False
+    trace, reference = result.motion, reference.motion
+    return all(np.array_equal(trace.group(group, field), reference.group(group, field))
+               for group in GROUPS for field in FIELDS)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    shapes = [shape for shape in args.shapes if shape in SHAPE_CATEGORY]
+    case_configs = [add_shorter_variant(get_case_configs(case, shape, args.early_abort))
+                    for case in args.cases for shape in shapes]
+    with SimSession() as session:
+        start = time.time()
+        references = [list(session.run(configs)) for configs in case_configs]
+        single_time = time.time() - start
+        start = time.time()
+        results = [simulate_variants(configs) for configs in case_configs]
+        shared_time = time.time() - start
+    mismatches = sum(not is_identical(r, ref) for rs, refs in zip(results, references) for r, ref in zip(rs, refs))
+    print("| one at a time {:.3f}s, shared prefixes {:.3f}s".format(single_time, shared_time))
+    print("| variants with different motion: {} / {}".format(mismatches, sum(len(c) for c in case_configs)))
@@ -1,11 +1,16 @@
-from multiprocessing import Pool, cpu_count
+from collections import deque
 import os
 import random
 
 import numpy as np
 from easydict import EasyDict
 
-from dataset.make_all import generate
+from dataset.make_all import generate, update_sim
+from phys_sim.cache import SimCache
+from phys_sim.pool import SimPool, DEFAULT_TIMEOUT
+from phys_sim.prescreen import predict_collision
+from phys_sim.run_sim import prepare_output, save_motion
+from render.worker import RenderWorker
 from utils.geometry import random_spherical_point, get_prospective_location
 from utils.io import mkdir, write_serialized, catch_abort
 from utils.constants import CONFIG_FOLDER, SIM_OUTPUT_FOLDER, RENDER_OUTPUT_FOLDER, VIDEO_OUTPUT_FOLDER, \
@@ -28,7 +33,33 @@ def parse_args():
     parser.add_argument("--stride", help="image index stride", type=int, default=1)
     parser.add_argument("--requires_valid", type=int, default=1)
     parser.add_argument("--preview", type=int, default=0)
+    parser.add_argument("--preview_video", help="stream the preview into a single video", type=int, default=0)
     parser.add_argument("--is_single_image", type=int, default=0)
+    parser.add_argument("--prescreen", help="reject configs with predicted collisions before simulation, "
+                                            "which also rejects some near misses pybullet finds valid",
+                        type=int, default=0)
+    parser.add_argument("--num_workers", help="simulate configs in a pool of worker processes, 0 to simulate "
+                                              "them one after another", type=int, default=0)
+    parser.add_argument("--sim_timeout", help="seconds before a worker simulating a config is restarted",
+                        type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--sim_cache", help="reuse the simulation of configs with the same physics", type=int,
+                        default=0)
+    parser.add_argument("--sim_cache_size", help="size of the simulation cache in GB", type=float, default=10.)
+    parser.add_argument("--record_every", help="record the motion of every n-th physics step only, "
+                                               "4 records the 25 frames per second that are rendered", type=int,
+                        default=1)
+    parser.add_argument("--motion_max_error", help="save motion as keyframes interpolated within this error",
+                        type=float)
+    parser.add_argument("--sim_primitives", help="simulate cubes as box primitives rather than meshes, "
+                                                 "which rest about 1mm lower and make more ground contacts",
+                        type=int, default=0)
+    parser.add_argument("--motion_chunk", help="write motion in chunks of this many steps while simulating, "
+                                               "0 to write it at once", type=int, default=0)
+    parser.add_argument("--render_worker", help="render every case in the same Blender session, "
+                                                "with the scene, materials and compositor nodes set up once",
+                        type=int, default=0)
+    parser.add_argument("--render_animation", help="render all frames of a case in one animation render "
+                                                   "with persistent data", type=int, default=0)
     return parser.parse_args()
 
 
@@ -152,7 +183,7 @@ def generate_config(case_name, args):
         sim = dict(output_dir=os.path.join(TRAIN_SIM_OUTPUT_FOLDER, case_name), sim_time=0.01)
     else:
         sim = dict(output_dir=os.path.join(TRAIN_SIM_OUTPUT_FOLDER, case_name), sim_time=5.)
-    rendering = dict(motion_file=os.path.join(TRAIN_SIM_OUTPUT_FOLDER, case_name, "motion.json"),
+    rendering = dict(motion_file=os.path.join(TRAIN_SIM_OUTPUT_FOLDER, case_name, "motion.npz"),
                      output_dir=os.path.join(TRAIN_RENDER_OUTPUT_FOLDER, case_name))
     video = dict(frame_dir=os.path.join(TRAIN_RENDER_OUTPUT_FOLDER, case_name),
                  output_dir=os.path.join(TRAIN_VIDEO_OUTPUT_FOLDER, case_name))
@@ -162,25 +193,97 @@ def generate_config(case_name, args):
     return scene
 
 
-def main(case_id, args):
+class RejectionStats(object):
+    """Acceptance rate of sampled configs, and simulation steps spent on rejected ones"""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.prescreened = 0
+        self.simulated_steps = 0
+        self.wasted_steps = 0
+        self.skipped_steps = 0
+
+    def record(self, result):
+        self.simulated_steps += result.steps_run
+        if result.valid:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+            self.wasted_steps += result.steps_run
+            self.skipped_steps += result.num_steps - result.steps_run
+
+    def record_prescreened(self):
+        self.prescreened += 1
+
+    def log(self):
+        attempts = self.accepted + self.rejected
+        print("| accepted {}/{} simulated configs ({:.1%}), {} configs rejected by prescreen, "
+              "{}/{} simulated steps wasted on rejected configs, {} steps skipped by early abort"
+              .format(self.accepted, attempts, self.accepted / max(attempts, 1), self.prescreened,
+                      self.wasted_steps, self.simulated_steps, self.skipped_steps))
+
+
+def sample_config(case_id, args, stats):
+    """Sample configs of a case until one passes the prescreen"""
+    while True:
+        config = EasyDict(generate_config("train_{:05d}".format(case_id), args))
+        update_sim(config, args)
+        if not args.prescreen or predict_collision(config) is None:
+            return config
+        stats.record_prescreened()
+
+
+def main(case_id, args, stats, sim_cache=None, render_worker=None):
     while True:
-        config = generate_config("train_{:05d}".format(case_id), args)
-        valid = generate(EasyDict(config), args)
+        config = sample_config(case_id, args, stats)
+        valid = generate(config, args, stats, sim_cache=sim_cache, render_worker=render_worker)
         if valid:
             break
+    stats.log()
+
+
+def main_pooled(case_ids, args, stats, render_worker=None):
+    """Generate cases as main does, with the configs of several cases simulated at once in a SimPool.
+    A case has a single config in the pool at a time, so its config file is the last one simulated"""
+    case_ids = deque(case_ids)
+    with SimPool(args.num_workers, args.sim_timeout) as pool:
+        tasks = {}
+
+        def submit(case_id):
+            config = sample_config(case_id, args, stats)
+            prepare_output(config.sim)
+            tasks[pool.submit(config)] = case_id, config
+
+        while len(case_ids) > 0 and len(tasks) < 2 * pool.num_workers:
+            submit(case_ids.popleft())
+        while len(tasks) > 0:
+            task_id, result = pool.get()
+            case_id, config = tasks.pop(task_id)
+            if not result.aborted:
+                save_motion(config.sim, result.motion)
+            if generate(config, args, stats, sim_result=result, render_worker=render_worker):
+                stats.log()
+                if len(case_ids) > 0:
+                    submit(case_ids.popleft())
+            else:
+                submit(case_id)
 
 
 if __name__ == '__main__':
     args = parse_args()
     catch_abort()
-    worker_args = []
     if args.start_index is None:
         args.start_index = args.start + get_host_id() % args.stride
-    for i in range(args.start_index, args.end, args.stride):
-        worker_args.append((i, args))
+    case_ids = range(args.start_index, args.end, args.stride)
 
-    # with Pool(2) as p:
-    #     p.starmap(main, worker_args)
-
-    for worker_arg in worker_args:
-        generate(*worker_arg)
+    stats = RejectionStats()
+    sim_cache = SimCache(max_bytes=int(args.sim_cache_size * 2 ** 30)) if args.sim_cache else None
+    render_worker = RenderWorker() if args.render_worker else None
+    if args.num_workers > 0:
+        main_pooled(case_ids, args, stats, render_worker)
+    else:
+        for case_id in case_ids:
+            main(case_id, args, stats, sim_cache, render_worker)
+    if render_worker is not None:
+        render_worker.log()
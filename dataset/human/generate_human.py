@@ -1,13 +1,17 @@
+import itertools
 import os
 import random
 
 from easydict import EasyDict
 import numpy as np
-from multiprocessing import Pool
 from dataset.human.build_occluders import get_occluders
 from dataset.human.build_objects import get_objects
 
-from dataset.make_all import generate
+from dataset.make_all import generate, update_sim
+from phys_sim import variants
+from phys_sim.cache import SimCache
+from phys_sim.pool import SimPool, DEFAULT_TIMEOUT
+from render.worker import RenderWorker
 from utils.io import write_serialized, catch_abort
 from utils.constants import HUMAN_CONFIG_FOLDER, HUMAN_SIM_OUTPUT_FOLDER, HUMAN_RENDER_OUTPUT_FOLDER, \
     HUMAN_VIDEO_OUTPUT_FOLDER
@@ -22,6 +26,31 @@ def parse_args():
     parser.add_argument("--stride", help="image index stride", type=int, default=1)
     parser.add_argument("--requires_valid", type=int, default=0)
     parser.add_argument("--preview", type=int, default=0)
+    parser.add_argument("--preview_video", help="stream the preview into a single video", type=int, default=0)
+    parser.add_argument("--share_prefix", help="simulate the steps variants of a case have in common once",
+                        type=int, default=0)
+    parser.add_argument("--num_workers", help="simulate configs in a pool of worker processes, "
+                                              "instead of sharing prefixes", type=int, default=0)
+    parser.add_argument("--sim_timeout", help="seconds before a worker simulating a config is restarted",
+                        type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--sim_cache", help="reuse the simulation of configs with the same physics", type=int,
+                        default=0)
+    parser.add_argument("--sim_cache_size", help="size of the simulation cache in GB", type=float, default=10.)
+    parser.add_argument("--record_every", help="record the motion of every n-th physics step only, "
+                                               "4 records the 25 frames per second that are rendered", type=int,
+                        default=1)
+    parser.add_argument("--motion_max_error", help="save motion as keyframes interpolated within this error",
+                        type=float)
+    parser.add_argument("--sim_primitives", help="simulate cubes as box primitives rather than meshes, "
+                                                 "which rest about 1mm lower and make more ground contacts",
+                        type=int, default=0)
+    parser.add_argument("--motion_chunk", help="write motion in chunks of this many steps while simulating, "
+                                               "0 to write it at once", type=int, default=0)
+    parser.add_argument("--render_worker", help="render every case in the same Blender session, "
+                                                "with the scene, materials and compositor nodes set up once",
+                        type=int, default=0)
+    parser.add_argument("--render_animation", help="render all frames of a case in one animation render "
+                                                   "with persistent data", type=int, default=0)
     return parser.parse_args()
 
 
@@ -45,6 +74,11 @@ def get_sim_pattern(case, i):
     return dict(sim_time=sim_time)
 
 
+def get_sibling_key(config):
+    """Variants of a case with the same shape, from the same call of generate_config"""
+    return config["case_name"].rsplit("_", 1)[0]
+
+
 def generate_config(case, shape):
     seed = int_hash((case, shape))
     np.random.seed(seed)
@@ -58,7 +92,7 @@ def generate_config(case, shape):
         case_name = "human_{}_{}_{:01d}".format(case, shape, i)
         sim_pattern = get_sim_pattern(case, i)
         sim = dict(output_dir=os.path.join(HUMAN_SIM_OUTPUT_FOLDER, case_name), **sim_pattern)
-        rendering = dict(motion_file=os.path.join(HUMAN_SIM_OUTPUT_FOLDER, case_name, "motion.json"),
+        rendering = dict(motion_file=os.path.join(HUMAN_SIM_OUTPUT_FOLDER, case_name, "motion.npz"),
                          output_dir=os.path.join(HUMAN_RENDER_OUTPUT_FOLDER, case_name))
         video = dict(frame_dir=os.path.join(HUMAN_RENDER_OUTPUT_FOLDER, case_name),
                      output_dir=os.path.join(HUMAN_VIDEO_OUTPUT_FOLDER, case_name),
@@ -91,7 +125,37 @@ if __name__ == '__main__':
         worker_args.append((EasyDict(config), args))
         write_serialized(config, os.path.join(HUMAN_CONFIG_FOLDER, config["case_name"] + ".yaml"))
 
-    # with Pool(5) as p:
-    #     p.starmap(generate, worker_args)
-    for worker_arg in worker_args:
-        generate(*worker_arg)
+    sim_cache = SimCache(max_bytes=int(args.sim_cache_size * 2 ** 30)) if args.sim_cache else None
+    render_worker = RenderWorker() if args.render_worker else None
+    if args.num_workers > 0:
+        for config, _ in worker_args:
+            update_sim(config, args)
+        with SimPool(args.num_workers, args.sim_timeout) as pool:
+            sim_results = pool.run([config for config, _ in worker_args], save=True)
+            for (config, _), sim_result in zip(worker_args, sim_results):
+                if not generate(config, args, sim_result=sim_result, render_worker=render_worker) \
+                        and sim_result.aborted:
+                    print("| {} skipped, its simulation crashed or timed out".format(config.case_name))
+    elif not args.share_prefix:
+        for worker_arg in worker_args:
+            generate(*worker_arg, sim_cache=sim_cache, render_worker=render_worker)
+    else:
+        for _, siblings in itertools.groupby(worker_args, key=lambda worker_arg: get_sibling_key(worker_arg[0])):
+            configs = [config for config, _ in siblings]
+            for config in configs:
+                update_sim(config, args)
+            sim_results = [None] * len(configs)
+            if sim_cache is not None and not args.preview:
+                sim_results = [sim_cache.load(config) for config in configs]
+            misses = [i for i, sim_result in enumerate(sim_results) if sim_result is None]
+            if len(misses) > 0:
+                for i, sim_result in zip(misses, variants.main([configs[i] for i in misses])):
+                    sim_results[i] = sim_result
+                    if sim_cache is not None and not args.preview:
+                        sim_cache.store(configs[i], sim_result)
+            if sim_cache is not None:
+                sim_cache.log()
+            for config, sim_result in zip(configs, sim_results):
+                generate(config, args, sim_result=sim_result, render_worker=render_worker)
+    if render_worker is not None:
+        render_worker.log()
@@ -18,11 +18,24 @@ def update_sim(config, args):
     sim.timestep = .01
     if "step_pattern" not in sim:
         sim.step_pattern = None
+    if "motion_format" not in sim:
+        sim.motion_format = "npz"
+    if "record_every" not in sim:
+        sim.record_every = getattr(args, "record_every", 1)
+    if "motion_max_error" not in sim:
+        sim.motion_max_error = getattr(args, "motion_max_error", None)
+    if "motion_chunk" not in sim:
+        sim.motion_chunk = getattr(args, "motion_chunk", 0)
+    if "use_primitives" not in sim:
+        sim.use_primitives = getattr(args, "sim_primitives", 0)
     sim.preview = args.preview
+    sim.preview_video = getattr(args, "preview_video", 0)
     sim.preview_fps = 25
+    # invalid motion is never rendered, so stop at the first collision
+    sim.early_abort = args.requires_valid
 
 
-def update_render(config):
+def update_render(config, args):
     rendering = config.rendering
     if "motion_file" not in rendering:
         raise KeyError("motion_file not specified")
@@ -31,6 +44,7 @@ def update_render(config):
     rendering.image_prefix = config.case_name
     rendering.data_dir = 'render/data'
     rendering.base_scene_blendfile = 'render/data/base_scene.blend'
+    rendering.template_blendfile = 'render/data/template.blend'
     rendering.material_dir = 'render/data/materials'
     rendering.shape_dir = 'render/data/shapes'
     # scene settings
@@ -59,6 +73,8 @@ def update_render(config):
     rendering.render_tile_size_gpu = 160
     if "intro_time" not in rendering:
         rendering.intro_time = 0.
+    if "render_animation" not in rendering:
+        rendering.render_animation = getattr(args, "render_animation", 0)
 
 
 def update_video(config):
@@ -76,15 +92,30 @@ def update_video(config):
         video.save_ogv = 0
 
 
-def generate(config, args):
-    """Generate video from config"""
+def generate(config, args, stats=None, sim_result=None, sim_cache=None, render_worker=None):
+    """Generate video from config, sim_result is the result of a simulation already run for it,
+    otherwise it is simulated, or loaded from sim_cache if it was simulated before.
+    It is rendered by render_worker if given, in the Blender session of earlier cases.
+    Return False without rendering if the config is rejected or its simulation did not finish,
+    as aborted motion is never saved"""
     update_sim(config, args)
-    update_render(config)
+    update_render(config, args)
     update_video(config)
-    valid = run_sim.main(config)
-    if not valid and args.requires_valid:
+    if sim_result is not None:
+        result = sim_result
+    elif sim_cache is not None:
+        result = sim_cache.main(config)
+        sim_cache.log()
+    else:
+        result = run_sim.main(config)
+    if stats is not None:
+        stats.record(result)
+    if result.aborted or (not result.valid and args.requires_valid):
         return False
-    run_render.main(config)
+    if render_worker is not None:
+        render_worker.render(config)
+    else:
+        run_render.main(config)
     make_video.make_mp4(config)
     return True
 
@@ -98,7 +129,7 @@ def only_make_video(config, args):
 def only_make_sim(config, args):
     """Generate video from config"""
     update_sim(config, args)
-    valid = run_sim.main(config)
-    if not valid and args.requires_valid:
+    result = run_sim.main(config)
+    if not result.valid and args.requires_valid:
         return False
     return True
@@ -0,0 +1,155 @@
+'''
+cache simulation results by a hash of the parts of a config that affect the physics,
+so that configs which only differ in rendering or video settings are simulated once
+'''
+
+import inspect
+import json
+import os
+import shutil
+import time
+
+from phys_sim import run_sim
+from phys_sim.objects import ObjectManager
+from phys_sim.result import SimResult
+from utils.constants import SIM_OUTPUT_FOLDER
+from utils.io import mkdir
+from utils.misc import md5_hash
+from utils.trace import read_trace, write_trace
+
+# change whenever the simulation of the same config changes
+CACHE_VERSION = 1
+SIM_CACHE_FOLDER = os.path.join(SIM_OUTPUT_FOLDER, "cache")
+DEFAULT_CACHE_SIZE = 10 * 2 ** 30
+SIM_KEYS = ("sim_time", "timestep", "step_pattern", "early_abort", "record_every", "use_primitives")
+RESULT_KEYS = ("valid", "num_steps", "steps_run", "aborted", "collision_step", "collision_bodies")
+
+
+def get_physics_params(add_entity, params):
+    """Arguments an ObjectManager method builds an entity with, with defaults filled in,
+    leaving out what it ignores such as color and material"""
+    arguments = inspect.signature(add_entity).bind_partial(**params)
+    arguments.apply_defaults()
+    return {k: v for k, v in arguments.arguments.items() if k != "kwargs"}
+
+
+def get_physics_key(config):
+    """Hash of everything in a config that affects its simulation"""
+    sim = config.sim
+    physics = dict(version=CACHE_VERSION, sim={k: sim.get(k) for k in SIM_KEYS},
+                   objects=[get_physics_params(ObjectManager.add_object, obj) for obj in config.get("objects", [])],
+                   occluders=[get_physics_params(ObjectManager.add_occluder, occluder)
+                              for occluder in config.get("occluders", [])],
+                   desks=[get_physics_params(ObjectManager.add_desk, desk) for desk in config.get("desks", [])])
+    return md5_hash(json.dumps(physics, sort_keys=True)).hexdigest()
+
+
+class SimCache(object):
+    """Results and motion traces of simulated configs in a folder, as key.json and key.npz,
+    evicting the least recently used entries beyond max_bytes"""
+
+    def __init__(self, folder=SIM_CACHE_FOLDER, max_bytes=DEFAULT_CACHE_SIZE):
+        self.folder = mkdir(folder)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> [bytes, time of last use], the time of the result file
+        self.entries = {}
+        for file_name in os.listdir(self.folder):
+            key, ext = os.path.splitext(file_name)
+            # files being written start with a dot
+            if ext not in (".json", ".npz") or key.startswith("."):
+                continue
+            stat = os.stat(os.path.join(self.folder, file_name))
+            entry = self.entries.setdefault(key, [0, 0.])
+            entry[0] += stat.st_size
+            if ext == ".json":
+                entry[1] = stat.st_mtime
+
+    @property
+    def num_bytes(self):
+        return sum(size for size, _ in self.entries.values())
+
+    def get_path(self, key, ext):
+        return os.path.join(self.folder, key + ext)
+
+    def load(self, config):
+        """Result of a cached config, with its motion saved to its output directory as run_sim.main does,
+        or None if the config was not simulated before"""
+        start = time.time()
+        key = get_physics_key(config)
+        result_file = self.get_path(key, ".json")
+        if key not in self.entries or not os.path.exists(result_file):
+            self.misses += 1
+            return None
+        with open(result_file) as f:
+            cached = json.load(f)
+        motion = None
+        if not cached["aborted"]:
+            run_sim.prepare_output(config.sim)
+            save_path = os.path.join(config.sim.output_dir, "motion.%s" % config.sim.motion_format)
+            # cached motion is kept exact, and compressed to keyframes as configured when it is saved
+            if config.sim.motion_format == "npz" and config.sim.get("motion_max_error") is None:
+                shutil.copyfile(self.get_path(key, ".npz"), save_path)
+                motion = read_trace(save_path)
+            else:
+                motion = read_trace(self.get_path(key, ".npz"))
+                write_trace(motion, save_path, config.sim.get("motion_max_error"))
+        os.utime(result_file)
+        self.entries[key][1] = time.time()
+        self.hits += 1
+        return SimResult(motion=motion, setup_time=0., step_time=time.time() - start, **cached)
+
+    def store(self, config, result):
+        """Cache the result of a config, whose motion run_sim.main has saved to its output directory"""
+        key = get_physics_key(config)
+        size = 0
+        if not result.aborted:
+            motion_file = os.path.join(config.sim.output_dir, "motion.npz")
+            trace_file, temp_file = self.get_path(key, ".npz"), self.get_path("." + key, ".npz")
+            if config.sim.motion_format == "npz" and config.sim.get("motion_max_error") is None \
+                    and os.path.exists(motion_file):
+                shutil.copyfile(motion_file, temp_file)
+            else:
+                write_trace(result.motion, temp_file)
+            os.replace(temp_file, trace_file)
+            size += os.path.getsize(trace_file)
+        # the result file is written last, so that an entry is complete once it exists
+        result_file, temp_file = self.get_path(key, ".json"), self.get_path("." + key, ".json")
+        with open(temp_file, "w") as f:
+            json.dump({k: getattr(result, k) for k in RESULT_KEYS}, f)
+        os.replace(temp_file, result_file)
+        size += os.path.getsize(result_file)
+        self.entries[key] = [size, time.time()]
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        num_bytes = self.num_bytes
+        for key, (size, _) in sorted(self.entries.items(), key=lambda entry: entry[1][1]):
+            if num_bytes <= self.max_bytes:
+                break
+            for ext in (".json", ".npz"):
+                if os.path.exists(self.get_path(key, ext)):
+                    os.remove(self.get_path(key, ext))
+            del self.entries[key]
+            num_bytes -= size
+            self.evictions += 1
+
+    def main(self, config):
+        """Simulate a config as run_sim.main does, unless it is cached.
+        Configs with preview images are always simulated"""
+        if config.sim.preview:
+            return run_sim.main(config)
+        result = self.load(config)
+        if result is None:
+            result = run_sim.main(config)
+            self.store(config, result)
+        return result
+
+    def log(self):
+        lookups = self.hits + self.misses
+        print("| sim cache: {}/{} hits ({:.1%}), {} misses, {} evictions, {} entries, {:.1f}MB"
+              .format(self.hits, lookups, self.hits / max(lookups, 1), self.misses, self.evictions,
+                      len(self.entries), self.num_bytes / 2 ** 20))
@@ -1,3 +1,4 @@
+import numpy as np
 import pybullet as p
 
 
@@ -54,3 +55,17 @@ class Camera(object):
     def take_seg(self):
         img_arr = p.getCameraImage(self.width, self.height, self.view_mat, self.proj_mat)
         return img_arr[4]
+
+    def take_images(self, segmentation=True):
+        """RGB, depth in meters and segmentation of a single render, segmentation is only rendered if asked for"""
+        flags = 0 if segmentation else p.ER_NO_SEGMENTATION_MASK
+        _, _, rgba, depth, seg = p.getCameraImage(self.width, self.height, self.view_mat, self.proj_mat, flags=flags)
+        rgb = np.reshape(np.asarray(rgba, dtype=np.uint8), (self.height, self.width, 4))[:, :, :3]
+        # the depth buffer is nonlinear between the near and the far plane
+        depth = np.reshape(np.asarray(depth, dtype=np.float32), (self.height, self.width))
+        depth = self.far_plane * self.near_plane / (self.far_plane - (self.far_plane - self.near_plane) * depth)
+        if segmentation:
+            seg = np.reshape(np.asarray(seg, dtype=np.int32), (self.height, self.width))
+        else:
+            seg = None
+        return rgb, depth, seg
@@ -0,0 +1,185 @@
+'''
+capture the raw base states of bodies into preallocated arrays while stepping,
+and convert them into a motion trace once the scene is done, or write them out in chunks as they fill up
+'''
+
+import numpy as np
+import pybullet as p
+
+from utils.trace import MotionTrace, TRACE_VERSION, STORED_FIELDS, FIELD_SIZES
+
+# position, quaternion, velocity and angular velocity, as returned by pybullet
+STATE_SIZE = 13
+
+
+def get_base_states(body_ids):
+    """Base states of shape (bodies, STATE_SIZE) with the fewest pybullet calls"""
+    if len(body_ids) == 0:
+        return np.zeros((0, STATE_SIZE))
+    return [position + orientation + velocity + angular_velocity
+            for (position, orientation), (velocity, angular_velocity)
+            in zip(map(p.getBasePositionAndOrientation, body_ids), map(p.getBaseVelocity, body_ids))]
+
+
+def get_fields(states):
+    """Location, quaternion, velocity and angular velocity of shape (bodies, records, 3 or 4) from states
+    of shape (records, bodies, STATE_SIZE)"""
+    states = states.transpose(1, 0, 2)
+    return dict(location=states[..., 0:3], quaternion=states[..., 3:7],
+                velocity=states[..., 7:10], angular_velocity=states[..., 10:13])
+
+
+class StateRecorder(object):
+    """Records of a group of entities, a new one at steps where they may have moved,
+    the previous one held for one more step otherwise"""
+
+    def __init__(self, num_steps, shape=(), dtype=np.float64):
+        self.records = np.zeros((num_steps,) + shape, dtype=dtype)
+        self.runs = np.zeros(num_steps, dtype=np.int32)
+        self.num_records = 0
+
+    @property
+    def latest(self):
+        return self.records[self.num_records - 1]
+
+    def add(self, values):
+        self.records[self.num_records] = values
+        self.runs[self.num_records] = 1
+        self.num_records += 1
+
+    def repeat(self):
+        self.runs[self.num_records - 1] += 1
+
+    def pop(self):
+        """Remove the last step"""
+        self.runs[self.num_records - 1] -= 1
+        if self.runs[self.num_records - 1] == 0:
+            self.num_records -= 1
+
+    def clear(self):
+        self.num_records = 0
+
+    def copy(self, num_steps):
+        """Copy of the records, with room for num_steps records"""
+        recorder = StateRecorder(num_steps, self.records.shape[1:], self.records.dtype)
+        recorder.records[:self.num_records] = self.records[:self.num_records]
+        recorder.runs[:self.num_records] = self.runs[:self.num_records]
+        recorder.num_records = self.num_records
+        return recorder
+
+
+class MotionCapture(object):
+    """Motion of the objects, occluders and desks of an ObjectManager, recorded every record_every steps
+    as base states of bodies and as steps of the precomputed occluder motion.
+    With a TraceWriter, only chunk_size recorded steps are kept, and each full chunk is written out"""
+
+    def __init__(self, om, num_steps, record_every=1, writer=None, chunk_size=0):
+        self.om = om
+        self.record_every = record_every
+        self.writer = writer
+        self.desk_body_ids = [body_id for desk_id in om.desk_ids for body_id in desk_id]
+        num_frames = -(-num_steps // record_every)
+        if writer is not None:
+            num_frames = min(num_frames, chunk_size)
+        self.objects = StateRecorder(num_frames, (len(om.object_ids), STATE_SIZE))
+        self.desks = StateRecorder(num_frames, (len(self.desk_body_ids), STATE_SIZE))
+        # the step of the occluder motion each record holds
+        self.occluders = StateRecorder(num_frames, dtype=np.int64)
+        # whether each group may have moved since the last recorded step
+        self.moved = dict(objects=False, occluders=False, desks=False)
+        self.num_steps = 0
+        self.num_frames = 0
+        self.chunk_frames = 0
+
+    @property
+    def recorders(self):
+        return self.objects, self.occluders, self.desks
+
+    def flush(self):
+        """Write out the recorded steps of the current chunk, and start the next one"""
+        self.writer.write_chunk(self.get_arrays(), self.chunk_frames)
+        for recorder in self.recorders:
+            recorder.clear()
+        self.chunk_frames = 0
+
+    def record(self, step, objects_moved, occluders_moved, desks_moved):
+        """Record a step if it is one of every record_every steps,
+        reading back only the groups that may have moved since the previous recorded step"""
+        self.moved["objects"] |= objects_moved
+        self.moved["occluders"] |= occluders_moved
+        self.moved["desks"] |= desks_moved
+        if step % self.record_every == 0:
+            if self.writer is not None and self.chunk_frames == len(self.objects.records):
+                self.flush()
+            groups = [(self.objects, "objects", lambda: get_base_states(self.om.object_ids)),
+                      (self.occluders, "occluders", lambda: step),
+                      (self.desks, "desks", lambda: get_base_states(self.desk_body_ids))]
+            for recorder, group, read in groups:
+                # each chunk starts with a record of every group
+                if self.chunk_frames == 0 or self.moved[group]:
+                    recorder.add(read())
+                else:
+                    recorder.repeat()
+                self.moved[group] = False
+            self.num_frames += 1
+            self.chunk_frames += 1
+        self.num_steps += 1
+
+    def pop(self):
+        """Remove the last step"""
+        self.num_steps -= 1
+        if self.num_steps % self.record_every == 0:
+            for recorder in self.recorders:
+                recorder.pop()
+            self.num_frames -= 1
+            self.chunk_frames -= 1
+
+    def get_object_locations(self):
+        """Locations of all objects at the last step, read back only if they moved since the last recorded step"""
+        if self.moved["objects"]:
+            return self.om.get_object_locations()
+        return self.objects.latest[:, 0:3]
+
+    def copy(self, om, num_steps):
+        """Copy of the steps recorded so far, continued for the same world built by another ObjectManager
+        that may have a different number of steps and different occluder patterns, only without a writer"""
+        capture = MotionCapture(om, 0, self.record_every)
+        num_frames = -(-num_steps // self.record_every)
+        capture.objects = self.objects.copy(num_frames)
+        capture.desks = self.desks.copy(num_frames)
+        capture.occluders = self.occluders.copy(num_frames)
+        capture.moved = dict(self.moved)
+        capture.num_steps = self.num_steps
+        capture.num_frames = capture.chunk_frames = self.num_frames
+        return capture
+
+    def get_arrays(self):
+        """Trace arrays of the steps recorded in the current chunk, keeping the records of each group with their runs"""
+        occluder_steps = self.occluders.records[:self.occluders.num_records]
+        if self.om.num_link > 0:
+            occluder_fields = {field: getattr(self.om.occluder_motion, field)[:, occluder_steps]
+                               for field in STORED_FIELDS}
+        else:
+            occluder_fields = {field: np.zeros((0, len(occluder_steps), FIELD_SIZES[field]))
+                               for field in STORED_FIELDS}
+        groups = dict(objects=(self.objects, get_fields(self.objects.records[:self.objects.num_records])),
+                      occluders=(self.occluders, occluder_fields),
+                      desks=(self.desks, get_fields(self.desks.records[:self.desks.num_records])))
+        arrays = {}
+        for group, (recorder, fields) in groups.items():
+            for field in STORED_FIELDS:
+                arrays["{}_{}".format(group, field)] = np.ascontiguousarray(fields[field], dtype=np.float32)
+            if recorder.num_records < self.chunk_frames:
+                arrays["{}_runs".format(group)] = recorder.runs[:recorder.num_records].copy()
+        return arrays
+
+    def to_trace(self, timestep):
+        """Motion trace of the recorded steps, or None once a writer has written out the last chunk"""
+        counts = dict(objects=len(self.om.object_ids), occluders=self.om.num_link, desks=len(self.om.desk_ids))
+        header = dict(version=TRACE_VERSION, timestep=timestep, num_steps=self.num_frames,
+                      record_every=self.record_every, counts=counts)
+        if self.writer is not None:
+            self.flush()
+            self.writer.close(header)
+            return None
+        return MotionTrace(header, self.get_arrays())
@@ -0,0 +1,40 @@
+import numpy as np
+import pybullet as p
+
+
+class ContactSnapshot(object):
+    """All contact points of the current step, fetched with a single getContactPoints call
+    and grouped by body id, to check the rules of ObjectManager.has_collision"""
+
+    def __init__(self):
+        points = p.getContactPoints()
+        body_a = np.array([c[1] for c in points], dtype=np.int64)
+        body_b = np.array([c[2] for c in points], dtype=np.int64)
+        normals = np.array([c[7] for c in points], dtype=np.float64).reshape(-1, 3)
+        # contacts are grouped once, as a snapshot may be shared by several scenes in one world
+        num_bodies = max(body_a.max(initial=-1), body_b.max(initial=-1)) + 1
+        self.counts = np.bincount(body_a, minlength=num_bodies) + np.bincount(body_b, minlength=num_bodies)
+        # only bodies with a single contact point use their normal
+        horizontal = np.any(np.abs(normals[:, :2]) > .1, axis=1)
+        self.horizontal = np.zeros(num_bodies, dtype=bool)
+        self.horizontal[body_a] = horizontal
+        self.horizontal[body_b] = horizontal
+
+    def colliding_bodies(self, object_ids, locations):
+        """Return the objects that make a collision, given their current locations:
+        more than one contact, a single contact with a horizontal normal, or inside the back wall"""
+        object_ids = np.asarray(object_ids, dtype=np.int64)
+        if len(object_ids) == 0:
+            return []
+        in_contact = object_ids < len(self.counts)
+        counts = np.zeros(len(object_ids), dtype=np.int64)
+        counts[in_contact] = self.counts[object_ids[in_contact]]
+        horizontal = np.zeros(len(object_ids), dtype=bool)
+        horizontal[in_contact] = self.horizontal[object_ids[in_contact]]
+        x = np.asarray(locations, dtype=np.float64).reshape(-1, 3)[:, 0]
+        colliding = (counts > 1) | ((counts == 1) & horizontal) | ((-4 < x) & (x < -2.8))
+        return object_ids[colliding].tolist()
+
+    def has_collision(self, object_ids, locations):
+        """Check if collision happens which involves objects"""
+        return len(self.colliding_bodies(object_ids, locations)) > 0
@@ -1,22 +1,29 @@
 import pybullet as p
 import re
-import os
 
 from phys_sim.convert_pattern import *
+from phys_sim.occluder_motion import OccluderMotion
+from phys_sim.shapes import CollisionShapeFactory
 from utils.constants import OCCLUDER_HALF_WIDTH
 from utils.shape_net import SHAPE_DIMENSIONS
 
 
 class ObjectManager(object):
+    """Bodies of one scene, which may share the pybullet world with other scenes,
+    so body ids are mapped to the order they were added in"""
 
-    def __init__(self, config, obj_dir, num_steps):
+    def __init__(self, config, obj_dir, num_steps, shapes=None):
         self.obj_dir = obj_dir
         self.config = config
         self.num_steps = num_steps
+        if shapes is None:
+            shapes = CollisionShapeFactory(obj_dir, config.sim.get("use_primitives", 0))
+        self.shapes = shapes
 
         self.plane_id, self.plane_visual_id = self.add_plane()
         self.object_ids = []
         self.desk_ids = []
+        self.body_index = {}
 
         self.disappear_time = []
         self.appear_time = []
@@ -36,6 +43,7 @@ class ObjectManager(object):
                 self.add_desk(**desk_params)
 
         self.ground_id = self.add_occluders_end()
+        self.occluder_motion = OccluderMotion(self.occluder_info, self.joint_patterns)
 
     def add_plane(self):
         """Add a plane"""
@@ -52,13 +60,13 @@ class ObjectManager(object):
         """
         scale = [x * y for x, y in zip(scale, SHAPE_DIMENSIONS[shape])]
         shape = "cube"
-        obj_path = os.path.join(self.obj_dir, "shapes", '%s.obj' % shape)
         init_orn_quat = p.getQuaternionFromEuler(deg2rad(init_orn))
-        col_id = p.createCollisionShape(p.GEOM_MESH, fileName=obj_path, meshScale=scale)
+        col_id = self.shapes.get(shape, scale)
         obj_id = p.createMultiBody(mass, col_id, basePosition=init_pos, baseOrientation=init_orn_quat)
         p.resetBaseVelocity(obj_id, linearVelocity=init_v)
         p.changeDynamics(obj_id, -1, lateralFriction=lat_fric, restitution=restitution, linearDamping=lin_damp,
                          angularDamping=angular_damp)
+        self.body_index[obj_id] = len(self.init_positions)
         self.init_positions.append(init_pos)
         self.disappear_time.append(disappear_time)
         self.appear_time.append(appear_time)
@@ -82,10 +90,8 @@ class ObjectManager(object):
     def add_occluder(self, shape="cube", joint="revolute", mass=1, init_pos=(0, 0, 0), init_orn=(0, 0, 0),
                      scale=(.2, 4., 2.), joint_pattern=None, **kwargs):
         """Add an occluder with physical properties"""
-        obj_path = os.path.join(self.obj_dir, "shapes", '%s.obj' % shape)
         init_orn_quat = p.getQuaternionFromEuler(deg2rad(init_orn))
-        col_id = p.createCollisionShape(p.GEOM_MESH, fileName=obj_path, meshScale=scale,
-                                        collisionFramePosition=(-scale[0], 0, scale[2]))
+        col_id = self.shapes.get(shape, scale, frame_position=(-scale[0], 0, scale[2]))
         self.occluder_info["linkMasses"].append(mass)
         self.occluder_info["linkCollisionShapeIndices"].append(col_id)
         self.occluder_info["linkVisualShapeIndices"].append(col_id)
@@ -138,20 +144,37 @@ class ObjectManager(object):
 
     def set_object_motion(self, obj_id, time):
         """Object may appear or disappear"""
+        index = self.body_index[obj_id]
         loc, quat = p.getBasePositionAndOrientation(obj_id)
         v, omega = p.getBaseVelocity(obj_id)
-        if time == 0 and self.appear_time[obj_id] != 0:
-            new_loc = loc[0] + 20 * (1 + obj_id), loc[1], loc[2]
+        if time == 0 and self.appear_time[index] != 0:
+            new_loc = loc[0] + 20 * (1 + index), loc[1], loc[2]
             p.resetBasePositionAndOrientation(obj_id, new_loc, quat)
             p.resetBaseVelocity(obj_id, v, omega)
-        if time != 0 and self.appear_time[obj_id] == time:
-            p.resetBasePositionAndOrientation(obj_id, self.init_positions[obj_id], quat)
+        if time != 0 and self.appear_time[index] == time:
+            p.resetBasePositionAndOrientation(obj_id, self.init_positions[index], quat)
             p.resetBaseVelocity(obj_id, v, omega)
-        if self.disappear_time[obj_id] == time:
-            new_loc = loc[0] + 20 * (1 + obj_id), loc[1], loc[2]
+        if self.disappear_time[index] == time:
+            new_loc = loc[0] + 20 * (1 + index), loc[1], loc[2]
             p.resetBasePositionAndOrientation(obj_id, new_loc, quat)
             p.resetBaseVelocity(obj_id, v, omega)
 
+    def has_object_event(self, time):
+        """Whether any object appears or disappears at a specific time, as in set_object_motion"""
+        for obj_id in self.object_ids:
+            index = self.body_index[obj_id]
+            if time == 0 and self.appear_time[index] != 0:
+                return True
+            if time != 0 and self.appear_time[index] == time:
+                return True
+            if self.disappear_time[index] == time:
+                return True
+        return False
+
+    def get_object_locations(self):
+        """Return the locations of all objects"""
+        return [p.getBasePositionAndOrientation(obj_id)[0] for obj_id in self.object_ids]
+
     def get_object_motion(self, obj_id):
         """Return the location, orientation, velocity and angular velocity of an object"""
         loc, quat = p.getBasePositionAndOrientation(obj_id)
@@ -170,8 +193,18 @@ class ObjectManager(object):
         """Set the rotation of the occluder to a specific rotation"""
         p.resetJointState(self.ground_id, link_id, self.joint_patterns[link_id][time])
 
-    def get_occluder_motion(self, link_id):
-        """Return the location, orientation, velocity and angular velocity of an occluder"""
+    def has_occluder_event(self, link_id, time):
+        """Whether the joint position of an occluder changes at a specific time"""
+        joint_pattern = self.joint_patterns[link_id]
+        return time == 0 or joint_pattern[time] != joint_pattern[time - 1]
+
+    def get_occluder_motion(self, link_id, time):
+        """Return the location, orientation, velocity and angular velocity of an occluder at a specific time,
+        occluders are kinematic, so their motion is computed from the joint pattern"""
+        return self.occluder_motion.get_motion(link_id, time)
+
+    def read_occluder_motion(self, link_id):
+        """Read back the location, orientation, velocity and angular velocity of an occluder from pybullet"""
         loc, quat, _, _, _, _, v, omega = p.getLinkState(self.ground_id, link_id, computeLinkVelocity=True)
         orn = p.getEulerFromQuaternion(quat)
         loc, orn, v, omega = list(loc), list(orn), list(v), list(omega)
@@ -192,6 +225,15 @@ class ObjectManager(object):
             desk_motion.append(self.get_object_motion(object_id))
         return desk_motion
 
+    def set_collision_group(self, group):
+        """Only collide with the bodies of the same group, so that scenes in different groups
+        can share the pybullet world without interacting"""
+        mask = 1 << group
+        for body_id in self.body_index:
+            p.setCollisionFilterGroupMask(body_id, -1, mask, mask)
+        for link_id in range(-1, self.num_link):
+            p.setCollisionFilterGroupMask(self.ground_id, link_id, mask, mask)
+
     def has_collision(self):
         """Check if collision happens which involves objects"""
         for object_id in self.object_ids:
@@ -0,0 +1,79 @@
+'''
+motion of kinematic occluders at every step, computed at once from their joint patterns
+instead of reading back each link from pybullet
+'''
+
+import numpy as np
+import pybullet as p
+
+from utils.constants import OCCLUDER_HALF_WIDTH
+from utils.rotation import quat_multiply, quat_rotate, quat_from_axis_angle, euler_from_quat
+
+
+def get_link_poses(joint_type, link_position, link_orientation, inertial_position, joint_axis, joint_positions):
+    """World position and orientation of shape (steps, 3) and (steps, 4) of the inertial frame of a link
+    whose parent is the ground at the origin, as pybullet.getLinkState"""
+    num_steps = len(joint_positions)
+    axis = np.asarray(joint_axis, dtype=np.float64)
+    if joint_type == p.JOINT_REVOLUTE:
+        joint_origin = np.tile(np.asarray(link_position, dtype=np.float64), (num_steps, 1))
+        orientation = quat_multiply(link_orientation, quat_from_axis_angle(axis, joint_positions))
+    elif joint_type == p.JOINT_PRISMATIC:
+        joint_origin = link_position + np.outer(joint_positions, quat_rotate(link_orientation, axis))
+        orientation = np.tile(np.asarray(link_orientation, dtype=np.float64), (num_steps, 1))
+    else:
+        raise NotImplementedError("Joint type not supported")
+    return joint_origin + quat_rotate(orientation, inertial_position), orientation, joint_origin
+
+
+def get_link_velocities(joint_type, link_orientation, joint_axis, center, joint_origin, joint_velocities):
+    """World velocity and angular velocity of shape (steps, 3) of the inertial frame of a link"""
+    axis = quat_rotate(link_orientation, joint_axis)
+    if joint_type == p.JOINT_REVOLUTE:
+        angular_velocity = np.outer(joint_velocities, axis)
+        return np.cross(angular_velocity, center - joint_origin), angular_velocity
+    return np.outer(joint_velocities, axis), np.zeros((len(joint_velocities), 3))
+
+
+class OccluderMotion(object):
+    """Location, orientation, velocity and angular velocity of shape (links, steps, 3), and quaternion
+    of shape (links, steps, 4), of the occluders of an ObjectManager,
+    as recorded by reading back getLinkState after resetJointState"""
+
+    def __init__(self, occluder_info, joint_patterns):
+        num_links = len(joint_patterns)
+        num_steps = max([len(joint_pattern) for joint_pattern in joint_patterns], default=0)
+        self.location = np.zeros((num_links, num_steps, 3))
+        self.orientation = np.zeros((num_links, num_steps, 3))
+        self.quaternion = np.zeros((num_links, num_steps, 4))
+        self.velocity = np.zeros((num_links, num_steps, 3))
+        self.angular_velocity = np.zeros((num_links, num_steps, 3))
+        for link_id, joint_pattern in enumerate(joint_patterns):
+            joint_type = occluder_info["linkJointTypes"][link_id]
+            link_position = np.add(occluder_info["basePosition"], occluder_info["linkPositions"][link_id])
+            link_orientation = occluder_info["linkOrientations"][link_id]
+            joint_axis = occluder_info["linkJointAxis"][link_id]
+            center, orientation, joint_origin = get_link_poses(
+                joint_type, link_position, link_orientation, occluder_info["linkInertialFramePositions"][link_id],
+                joint_axis, joint_pattern)
+            # resetJointState sets the joint velocity to zero
+            velocity, angular_velocity = get_link_velocities(joint_type, link_orientation, joint_axis, center,
+                                                             joint_origin, np.zeros(len(joint_pattern)))
+            euler = euler_from_quat(orientation)
+            # occluders lying backwards are recorded at the height of their front face
+            center[:, 2] += np.where(euler[:, 1] < 0, 2 * np.sin(-euler[:, 1]) * OCCLUDER_HALF_WIDTH, 0)
+            steps = slice(0, len(joint_pattern))
+            self.location[link_id, steps] = center
+            self.orientation[link_id, steps] = euler
+            self.quaternion[link_id, steps] = orientation
+            self.velocity[link_id, steps] = velocity
+            self.angular_velocity[link_id, steps] = angular_velocity
+
+    def get_motion(self, link_id, time):
+        """Motion dict of an occluder at a specific time, as ObjectManager.get_occluder_motion"""
+        return {
+            'location': self.location[link_id, time].tolist(),
+            'orientation': self.orientation[link_id, time].tolist(),
+            'velocity': self.velocity[link_id, time].tolist(),
+            'angular_velocity': self.angular_velocity[link_id, time].tolist()
+        }
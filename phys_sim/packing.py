@@ -0,0 +1,80 @@
+'''
+simulate several independent scenes together in one pybullet world
+'''
+
+import json
+import time
+
+import pybullet as p
+
+from phys_sim.contacts import ContactSnapshot
+from phys_sim.run_sim import SceneSimulation, setup_world
+from phys_sim.shapes import CollisionShapeFactory
+
+# each scene of a pack gets one bit of the collision filter mask
+MAX_PACK_SIZE = 31
+
+
+def get_pack_key(config):
+    """Scenes can only be stepped together if they share the timestep and the step pattern,
+    and share collision shapes if they load them from the same directory as the same kind of shape"""
+    sim = config.sim
+    return sim.timestep, json.dumps(sim.step_pattern), sim.obj_dir, sim.get("use_primitives", 0)
+
+
+def can_pack(config):
+    """Only scenes that stop at their first collision are packed, as packing changes the order in which
+    contacts are solved, and so the motion after a collision. Scenes with preview are not packed,
+    as the camera would see the other scenes"""
+    return bool(config.sim.get("early_abort", 0)) and not config.sim.preview
+
+
+def iter_packs(configs, pack_size):
+    """Group consecutive configs into packs of at most pack_size configs with the same pack key,
+    configs that cannot be packed are in packs of their own"""
+    pack_size = min(pack_size, MAX_PACK_SIZE)
+    pack = []
+    for config in configs:
+        if len(pack) > 0 and (len(pack) == pack_size or not can_pack(pack[0]) or not can_pack(config)
+                              or get_pack_key(pack[0]) != get_pack_key(config)):
+            yield pack
+            pack = []
+        pack.append(config)
+    if len(pack) > 0:
+        yield pack
+
+
+def simulate_packed(configs):
+    """Build the scenes of configs in the connected pybullet world, each in its own collision group,
+    with one collision shape factory, and step them together. Return one result per config as in run_sim.simulate,
+    with the setup and step time of the pack shared equally between its scenes"""
+    if len(configs) > MAX_PACK_SIZE:
+        raise ValueError("At most {} scenes can be packed".format(MAX_PACK_SIZE))
+    if not all(can_pack(config) for config in configs):
+        raise ValueError("Packed scenes must set sim.early_abort and have no preview, "
+                         "as their motion after a collision differs from a separate run")
+    if len(set(get_pack_key(config) for config in configs)) > 1:
+        raise ValueError("Packed scenes must share timestep, step pattern, obj_dir and use_primitives")
+    setup_start = time.time()
+    setup_world(configs[0].sim)
+    # the scenes of a pack share the collision shapes of the same source and scale
+    shapes = CollisionShapeFactory(configs[0].sim.obj_dir, configs[0].sim.get("use_primitives", 0))
+    scenes = [SceneSimulation(config, collision_group=k, shapes=shapes) for k, config in enumerate(configs)]
+
+    step_start = time.time()
+    for i in range(max(scene.num_steps for scene in scenes)):
+        # one snapshot holds the contacts of every scene, as contact points only change in stepSimulation
+        if any(scene.needs_contacts for scene in scenes):
+            contacts = ContactSnapshot()
+        needs_step = False
+        for scene in scenes:
+            if not scene.done:
+                needs_step |= scene.record(i, contacts)
+        if needs_step:
+            p.stepSimulation()
+        if all(scene.done for scene in scenes):
+            break
+
+    step_end = time.time()
+    return [scene.result((step_start - setup_start) / len(scenes), (step_end - step_start) / len(scenes))
+            for scene in scenes]
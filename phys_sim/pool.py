@@ -0,0 +1,244 @@
+'''
+simulate configs in a pool of worker processes, each keeping a live pybullet client,
+with motion traces handed back to the parent through shared memory instead of motion files
+'''
+
+from collections import deque
+from multiprocessing import Pipe, Process, cpu_count, resource_tracker
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+import os
+import signal
+import time
+import traceback
+
+import numpy as np
+
+from phys_sim.result import SimResult
+from phys_sim.run_sim import prepare_output, save_motion
+from phys_sim.session import SimSession
+from utils.trace import MotionTrace
+
+DEFAULT_TIMEOUT = 300.
+
+
+def write_shared_trace(trace, name):
+    """Copy the arrays of a motion trace into a new shared memory block,
+    return the layout read_shared_trace needs to read them back"""
+    arrays, offset = [], 0
+    for key, value in trace.arrays.items():
+        value = np.ascontiguousarray(value)
+        arrays.append((key, value.dtype.str, value.shape, offset))
+        offset += value.nbytes
+    # shared memory blocks can not be empty
+    shm = SharedMemory(name, create=True, size=max(offset, 1))
+    for key, dtype, shape, start in arrays:
+        np.ndarray(shape, dtype, buffer=shm.buf, offset=start)[...] = trace.arrays[key]
+    shm.close()
+    return dict(header=trace.header, arrays=arrays)
+
+
+def read_shared_trace(name, layout):
+    """Copy a motion trace out of a shared memory block written by write_shared_trace, and free the block"""
+    shm = SharedMemory(name)
+    arrays = {key: np.ndarray(shape, dtype, buffer=shm.buf, offset=start).copy()
+              for key, dtype, shape, start in layout["arrays"]}
+    shm.close()
+    shm.unlink()
+    return MotionTrace(layout["header"], arrays)
+
+
+def unlink_shared_trace(name):
+    """Free the shared memory block of a task whose worker died, if it was created at all"""
+    try:
+        shm = SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def worker_main(conn):
+    """Simulate (task id, shared memory name, config) tasks received on conn until None is received.
+    Python errors are sent back to the parent instead of ending the worker"""
+    # ctrl-C is handled by the parent, which terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with SimSession() as session:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            task_id, shm_name, config = task
+            try:
+                result = session.simulate(config)
+                layout = None
+                if not result.aborted:
+                    layout = write_shared_trace(result.motion, shm_name)
+                result.motion = None
+                conn.send((task_id, result, layout, None))
+            except Exception:
+                conn.send((task_id, None, None, traceback.format_exc()))
+
+
+def get_failed_result(config, elapsed):
+    """Result of a config whose simulation did not finish, counted as invalid"""
+    num_steps = int(config.sim.sim_time / config.sim.timestep)
+    return SimResult(motion=None, valid=False, num_steps=num_steps, steps_run=0, aborted=True,
+                     collision_step=None, collision_bodies=[], setup_time=0., step_time=elapsed)
+
+
+class SimWorker(object):
+    """A worker process, and the task it is simulating"""
+
+    def __init__(self):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.start_time = None
+
+    def assign(self, task):
+        self.task = task
+        self.start_time = time.time()
+        self.conn.send(task)
+
+    def stop(self, timeout=1.):
+        """Stop the worker, killing it if it is busy or does not exit in time"""
+        if self.task is None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SimPool(object):
+    """Worker processes that simulate configs submitted by the parent, as SimSession.simulate does.
+    A worker that crashes or exceeds the per case timeout is replaced by a new one,
+    and its config gets an invalid result with aborted set"""
+
+    def __init__(self, num_workers=None, timeout=DEFAULT_TIMEOUT):
+        self.num_workers = num_workers if num_workers else cpu_count()
+        self.timeout = timeout
+        # workers share the resource tracker of the parent, which frees their blocks if the parent dies
+        resource_tracker.ensure_running()
+        self.workers = [SimWorker() for _ in range(self.num_workers)]
+        self.pending = deque()
+        self.num_tasks = 0
+        self.num_restarts = 0
+
+    def submit(self, config):
+        """Queue a config for simulation, return the task id its result is returned with by get"""
+        task_id = self.num_tasks
+        self.num_tasks += 1
+        shm_name = "sim_{}_{}".format(os.getpid(), task_id)
+        self.pending.append((task_id, shm_name, config))
+        self.dispatch()
+        return task_id
+
+    def dispatch(self):
+        for worker in self.workers:
+            if worker.task is None and len(self.pending) > 0:
+                worker.assign(self.pending.popleft())
+
+    @property
+    def num_busy(self):
+        return sum(worker.task is not None for worker in self.workers) + len(self.pending)
+
+    def restart(self, worker, reason):
+        """Replace a worker that died or timed out, return the failed result of its task"""
+        task_id, shm_name, config = worker.task
+        elapsed = time.time() - worker.start_time
+        print("| {}: simulation worker {} after {:.1f}s, restarting it".format(config.sim.img_name_prefix,
+                                                                              reason, elapsed))
+        worker.stop()
+        unlink_shared_trace(shm_name)
+        self.workers[self.workers.index(worker)] = SimWorker()
+        self.num_restarts += 1
+        return task_id, get_failed_result(config, elapsed)
+
+    def complete(self, worker, message):
+        task_id, result, layout, error = message
+        _, shm_name, config = worker.task
+        elapsed = time.time() - worker.start_time
+        worker.task = None
+        if error is not None:
+            print("| {}: simulation failed\n{}".format(config.sim.img_name_prefix, error))
+            return task_id, get_failed_result(config, elapsed)
+        if layout is not None:
+            result.motion = read_shared_trace(shm_name, layout)
+        return task_id, result
+
+    def get(self):
+        """Wait for any submitted config to finish, return its task id and its result"""
+        while True:
+            self.dispatch()
+            busy = [worker for worker in self.workers if worker.task is not None]
+            if len(busy) == 0:
+                raise ValueError("no config is being simulated")
+            deadline = min(worker.start_time for worker in busy) + self.timeout
+            ready = wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy],
+                         max(deadline - time.time(), 0))
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        return self.complete(worker, worker.conn.recv())
+                    except EOFError:
+                        return self.restart(worker, "crashed with exit code {}".format(worker.process.exitcode))
+                if worker.process.sentinel in ready:
+                    worker.process.join()
+                    return self.restart(worker, "crashed with exit code {}".format(worker.process.exitcode))
+                if time.time() - worker.start_time > self.timeout:
+                    return self.restart(worker, "timed out")
+
+    def run(self, configs, save=False, window=None):
+        """Simulate an iterable of configs and yield one result per config, in order,
+        optionally saving each motion to its output directory.
+        At most window configs, twice the number of workers by default, are submitted
+        but not yielded yet, which bounds the memory of finished traces waiting for an earlier config"""
+        window = window if window else 2 * self.num_workers
+        configs = iter(configs)
+        submitted, results = {}, {}
+        next_task_id = None
+        exhausted = False
+        while True:
+            while not exhausted and len(results) + self.num_busy < window:
+                try:
+                    config = next(configs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if save:
+                    prepare_output(config.sim)
+                task_id = self.submit(config)
+                submitted[task_id] = config
+                if next_task_id is None:
+                    next_task_id = task_id
+            if next_task_id is None or next_task_id == self.num_tasks:
+                return
+            while next_task_id not in results:
+                task_id, result = self.get()
+                results[task_id] = result
+            config, result = submitted.pop(next_task_id), results.pop(next_task_id)
+            if save and not result.aborted:
+                save_motion(config.sim, result.motion)
+            yield result
+            next_task_id += 1
+
+    def close(self):
+        for worker in self.workers:
+            if worker.task is not None:
+                unlink_shared_trace(worker.task[1])
+            worker.stop()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,155 @@
+'''
+predict collisions of a config from straight line motion, before it is simulated in pybullet
+'''
+
+import numpy as np
+
+from phys_sim.convert_pattern import convert_step_patterns, convert_rot_patterns, convert_trans_patterns
+from utils.geometry import deg2rad
+from utils.shape_net import SHAPE_DIMENSIONS
+
+# objects closer than this are treated as touching
+MARGIN = .01
+
+
+def get_step_counts(sim, num_steps):
+    """Number of times stepSimulation is called before each step, following sim.step_pattern"""
+    if sim.step_pattern is None:
+        step_pattern = np.ones(num_steps)
+    else:
+        step_pattern = convert_step_patterns(sim.step_pattern)[:num_steps]
+    return np.concatenate([[0], np.cumsum(step_pattern)[:-1]])
+
+
+def get_object_paths(objects, sim, num_steps):
+    """Planar centers of shape (objects, steps, 2) of objects sliding in straight lines,
+    and whether they are in the scene rather than moved away by set_object_motion"""
+    step_counts = get_step_counts(sim, num_steps)
+    steps = np.arange(num_steps)
+    centers = np.zeros((len(objects), num_steps, 2))
+    visible = np.zeros((len(objects), num_steps), dtype=bool)
+    for i, obj in enumerate(objects):
+        appear_time = obj.get("appear_time", 0)
+        disappear_time = obj.get("disappear_time", 100000)
+        init_v = np.array(obj.get("init_v", (0, 0, 0))[:2], dtype=np.float64)
+        if obj.get("mass", 1) == 0:
+            init_v = np.zeros(2)
+        if 0 < appear_time < num_steps:
+            elapsed = step_counts - step_counts[appear_time]
+        else:
+            elapsed = step_counts
+        centers[i] = np.array(obj["init_pos"][:2]) + np.outer(elapsed * sim.timestep, init_v)
+        visible[i] = (steps >= appear_time) & (steps < disappear_time)
+    return centers, visible
+
+
+def get_object_boxes(objects):
+    """Planar half extents of shape (objects, 2), yaw and height of the bounding boxes of objects"""
+    half_extents, yaws, heights = [], [], []
+    for obj in objects:
+        extent = np.array([s * d for s, d in zip(obj["scale"], SHAPE_DIMENSIONS[obj["shape"]])])
+        init_orn = obj.get("init_orn", (0, 0, 0))
+        if init_orn[0] != 0 or init_orn[1] != 0:
+            # tilted objects are bounded by a sphere
+            extent = np.full(3, np.linalg.norm(extent))
+        half_extents.append(extent[:2])
+        yaws.append(deg2rad(init_orn[2]))
+        heights.append(obj["init_pos"][2] + extent[2])
+    return np.array(half_extents), np.array(yaws), np.array(heights)
+
+
+def boxes_overlap(center_1, yaw_1, half_1, center_2, yaw_2, half_2, margin=MARGIN):
+    """Whether planar oriented boxes overlap, by the separating axis theorem,
+    arrays of centers (..., 2), yaws (...) and half extents (..., 2) are broadcast"""
+    axes_1 = np.stack([np.stack([np.cos(yaw_1), np.sin(yaw_1)], -1),
+                       np.stack([-np.sin(yaw_1), np.cos(yaw_1)], -1)], -2)
+    axes_2 = np.stack([np.stack([np.cos(yaw_2), np.sin(yaw_2)], -1),
+                       np.stack([-np.sin(yaw_2), np.cos(yaw_2)], -1)], -2)
+    axes_1, axes_2 = np.broadcast_arrays(axes_1, axes_2)
+    offset = np.asarray(center_2) - np.asarray(center_1)
+    overlap = True
+    for axes in (axes_1, axes_2):
+        for k in range(2):
+            axis = axes[..., k, :]
+            radius_1 = np.abs(np.einsum("...ij,...j->...i", axes_1, axis)) * half_1
+            radius_2 = np.abs(np.einsum("...ij,...j->...i", axes_2, axis)) * half_2
+            distance = np.abs(np.sum(offset * axis, -1))
+            overlap = overlap & (distance <= radius_1.sum(-1) + radius_2.sum(-1) + margin)
+    return overlap
+
+
+def get_occluder_boxes(occluder, joint_pattern, height):
+    """Planar centers (steps, 2), yaw and half extents (steps, 2) of the part of an occluder
+    below height, and whether any part of the occluder is below height"""
+    thick, half_width, half_height = occluder.get("scale", (.2, 4., 2.))
+    init_pos = np.array(occluder.get("init_pos", (0, 0, 0))[:2], dtype=np.float64)
+    yaw = deg2rad(occluder.get("init_orn", (0, 0, 0))[2])
+    num_steps = len(joint_pattern)
+    if occluder.get("joint", "revolute") == "prismatic":
+        local_x = np.full((num_steps, 2), [-2 * thick, 0.])
+        local_y = np.stack([joint_pattern - half_width, joint_pattern + half_width], -1)
+        below = np.ones(num_steps, dtype=bool)
+    else:
+        # the mid plane of the occluder rotates about the y axis through the origin,
+        # a point at s along it is at x = -thick cos q + s sin q, z = thick sin q + s cos q
+        cos_q, sin_q = np.cos(joint_pattern), np.sin(joint_pattern)
+        upright = np.abs(cos_q) > 1e-6
+        safe_cos = np.where(upright, cos_q, 1.)
+        s_low = (-thick - thick * sin_q) / safe_cos
+        s_high = (height + thick - thick * sin_q) / safe_cos
+        s_low, s_high = np.minimum(s_low, s_high), np.maximum(s_low, s_high)
+        lying_inside = (-thick <= thick * sin_q) & (thick * sin_q <= height + thick)
+        s_low = np.where(upright, np.maximum(s_low, 0), np.where(lying_inside, 0, np.inf))
+        s_high = np.where(upright, np.minimum(s_high, 2 * half_height),
+                          np.where(lying_inside, 2 * half_height, -np.inf))
+        below = s_low <= s_high
+        s_low, s_high = np.where(below, s_low, 0), np.where(below, s_high, 0)
+        x_low = -thick * cos_q + s_low * sin_q
+        x_high = -thick * cos_q + s_high * sin_q
+        local_x = np.stack([np.minimum(x_low, x_high) - thick, np.maximum(x_low, x_high) + thick], -1)
+        local_y = np.full((num_steps, 2), [-half_width, half_width])
+    local_center = np.stack([local_x.mean(-1), local_y.mean(-1)], -1)
+    half_extents = np.stack([np.diff(local_x, axis=-1)[:, 0], np.diff(local_y, axis=-1)[:, 0]], -1) / 2
+    rotation = np.array([[np.cos(yaw), -np.sin(yaw)], [np.sin(yaw), np.cos(yaw)]])
+    centers = init_pos + local_center @ rotation.T
+    return centers, yaw, half_extents, below
+
+
+def get_joint_pattern(occluder, num_steps):
+    """Joint position of an occluder at each step, as in ObjectManager.add_occluder"""
+    joint_pattern = occluder.get("joint_pattern", None)
+    if joint_pattern is None:
+        return np.zeros(num_steps)
+    if occluder.get("joint", "revolute") == "prismatic":
+        return convert_trans_patterns(joint_pattern)[:num_steps]
+    return convert_rot_patterns(joint_pattern)[:num_steps]
+
+
+def predict_collision(config):
+    """Sweep the bounding box of each object along its straight line path, and return the first step
+    at which two objects touch, an object touches an occluder or enters the back wall, or None.
+    Configs with desks are not screened"""
+    sim = config.sim
+    num_steps = int(sim.sim_time / sim.timestep)
+    objects = config.get("objects", [])
+    if len(config.get("desks", [])) > 0 or len(objects) == 0 or num_steps == 0:
+        return None
+    centers, visible = get_object_paths(objects, sim, num_steps)
+    half_extents, yaws, heights = get_object_boxes(objects)
+
+    colliding = visible & (-4 < centers[..., 0]) & (centers[..., 0] < -2.8)
+    for i in range(len(objects)):
+        for j in range(i + 1, len(objects)):
+            overlap = boxes_overlap(centers[i], yaws[i], half_extents[i], centers[j], yaws[j], half_extents[j])
+            colliding[i] |= overlap & visible[i] & visible[j]
+        for occluder in config.get("occluders", []):
+            joint_pattern = get_joint_pattern(occluder, num_steps)
+            occluder_centers, occluder_yaw, occluder_extents, below = get_occluder_boxes(occluder, joint_pattern,
+                                                                                         heights[i])
+            overlap = boxes_overlap(centers[i], yaws[i], half_extents[i], occluder_centers, occluder_yaw,
+                                    occluder_extents)
+            colliding[i] |= overlap & below & visible[i]
+    steps = np.flatnonzero(colliding.any(axis=0))
+    if len(steps) == 0:
+        return None
+    return int(steps[0])
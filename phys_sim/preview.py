@@ -0,0 +1,77 @@
+'''
+preview images of a scene while it is stepped, with one render of the pybullet camera per image,
+encoded to png in background threads or piped into a single preview video
+'''
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import imageio
+import numpy as np
+
+from dataset.make_video import ffmpeg
+
+DEFAULT_PREVIEW_THREADS = 2
+# images waiting to be encoded per thread, before stepping waits for them
+MAX_PENDING = 4
+
+
+class PreviewWriter(object):
+    """Saves preview images of a scene to output_dir/imgs, as png images encoded by sim.preview_threads threads,
+    or with sim.preview_video as frames of output_dir/preview.mp4. With sim.preview_passes, the depth in millimeters
+    and the segmentation by body id + 1 of each image are saved as well"""
+
+    def __init__(self, sim, camera):
+        self.sim = sim
+        self.camera = camera
+        self.passes = sim.get("preview_passes", 0)
+        self.num_threads = sim.get("preview_threads", DEFAULT_PREVIEW_THREADS)
+        self.executor = ThreadPoolExecutor(self.num_threads)
+        self.futures = []
+        self.video = None
+        if sim.get("preview_video", 0):
+            video_path = os.path.join(sim.output_dir, "preview.mp4")
+            print('| saving preview video to %s' % video_path)
+            self.video = subprocess.Popen([ffmpeg, "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                           "-s", "{}x{}".format(camera.width, camera.height),
+                                           "-r", str(sim.preview_fps), "-i", "-", "-pix_fmt", "yuv420p",
+                                           "-vcodec", "libx264", video_path, "-y"], stdin=subprocess.PIPE)
+
+    def get_path(self, step, name=""):
+        return os.path.join(self.sim.output_dir, 'imgs',
+                            '%s%s_%06.2fs.png' % (self.sim.img_name_prefix, name, step * self.sim.timestep))
+
+    def save(self, path, image):
+        print('| saving to %s' % path)
+        self.futures.append(self.executor.submit(imageio.imsave, path, image))
+
+    def write(self, step):
+        """Capture the preview of the current step, and leave its encoding to the background"""
+        rgb, depth, seg = self.camera.take_images(segmentation=bool(self.passes))
+        if self.video is not None:
+            self.video.stdin.write(rgb.tobytes())
+        else:
+            self.save(self.get_path(step), rgb)
+        if self.passes:
+            self.save(self.get_path(step, "_depth"), np.clip(depth * 1000, 0, 2 ** 16 - 1).astype(np.uint16))
+            self.save(self.get_path(step, "_seg"), (seg + 1).astype(np.uint8))
+        pending = []
+        for future in self.futures:
+            if future.done():
+                # raise errors of encoding as early as possible
+                future.result()
+            else:
+                pending.append(future)
+        while len(pending) > MAX_PENDING * self.num_threads:
+            pending.pop(0).result()
+        self.futures = pending
+
+    def close(self):
+        """Wait until every image is saved, raising the first error of encoding them"""
+        for future in self.futures:
+            future.result()
+        self.executor.shutdown()
+        if self.video is not None:
+            self.video.stdin.close()
+            self.video.wait()
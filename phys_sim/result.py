@@ -0,0 +1,20 @@
+'''
+result of simulating a scene, shared by the modules that simulate scenes
+'''
+
+
+class SimResult(object):
+    """Motion trace, validity and timings of a simulated scene. Unlike an EasyDict,
+    it does not convert the motion into nested EasyDicts"""
+
+    def __init__(self, motion, valid, num_steps, steps_run, aborted, collision_step, collision_bodies,
+                 setup_time, step_time):
+        self.motion = motion
+        self.valid = valid
+        self.num_steps = num_steps
+        self.steps_run = steps_run
+        self.aborted = aborted
+        self.collision_step = collision_step
+        self.collision_bodies = collision_bodies
+        self.setup_time = setup_time
+        self.step_time = step_time
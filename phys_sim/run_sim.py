@@ -8,15 +8,19 @@ import pybullet_data
 import argparse
 import json
 
-import imageio
 from easydict import EasyDict
 import pybullet as p
 
 import os
 from phys_sim.camera import Camera
+from phys_sim.capture import MotionCapture
+from phys_sim.contacts import ContactSnapshot
 from phys_sim.objects import ObjectManager
+from phys_sim.preview import PreviewWriter, DEFAULT_PREVIEW_THREADS
+from phys_sim.result import SimResult
 from phys_sim.convert_pattern import *
-from utils.io import read_serialized, write_serialized, clr_dir
+from utils.io import read_serialized, clr_dir
+from utils.trace import write_trace, TraceWriter
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--config_file', default='config/demo_config.json', type=str,
@@ -35,10 +39,36 @@ parser.add_argument('--preview', default=0, type=int,
                     help='save rendered video from pybullet')
 parser.add_argument('--preview_fps', default=25, type=int,
                     help='preview video frame per second')
+parser.add_argument('--preview_video', default=0, type=int,
+                    help='stream the preview into preview.mp4 instead of saving images')
+parser.add_argument('--preview_passes', default=0, type=int,
+                    help='save depth and segmentation images along with the preview')
+parser.add_argument('--preview_threads', default=DEFAULT_PREVIEW_THREADS, type=int,
+                    help='number of threads encoding preview images')
+parser.add_argument('--motion_format', default='npz', type=str, choices=['npz', 'json'],
+                    help='format of the saved motion file')
+parser.add_argument('--early_abort', default=0, type=int,
+                    help='stop at the first collision without saving the motion')
+parser.add_argument('--use_primitives', default=0, type=int,
+                    help='create cubes as box primitives rather than meshes, which changes their contacts')
+parser.add_argument('--record_every', default=1, type=int,
+                    help='record the motion of every n-th step only, e.g. 4 for 25 fps at a timestep of 0.01')
+parser.add_argument('--motion_max_error', default=None, type=float,
+                    help='save only the keyframes the motion can be interpolated from within this error')
+parser.add_argument('--motion_chunk', default=0, type=int,
+                    help='write the motion to motion.npz in chunks of this many recorded steps while stepping')
 
 
-def main(config):
-    sim = config.sim
+def setup_world(sim):
+    """Set search path, gravity and engine parameters of the current pybullet world"""
+    p.setAdditionalSearchPath(pybullet_data.getDataPath())
+    p.setGravity(0, 0, -1)
+    p.setTimeStep(sim.timestep)
+    p.setPhysicsEngineParameter(contactBreakingThreshold=.0002)
+
+
+def prepare_output(sim):
+    """Create the output directory, and an empty preview directory if needed"""
     if not os.path.exists(sim.output_dir):
         os.makedirs(sim.output_dir)
     if sim.preview and not os.path.exists(os.path.join(sim.output_dir, 'imgs')):
@@ -46,94 +76,182 @@ def main(config):
     if sim.preview:
         clr_dir(os.path.join(sim.output_dir, 'imgs'))
 
-    physicsClient = p.connect(p.DIRECT)
-    p.setAdditionalSearchPath(pybullet_data.getDataPath())
-    p.setGravity(0, 0, -1)
-    p.setTimeStep(sim.timestep)
-    p.setPhysicsEngineParameter(contactBreakingThreshold=.0002)
 
-    preview_every = int((1 / sim.preview_fps) // sim.timestep)
-    num_steps = int(sim.sim_time / sim.timestep)
+class SceneSimulation(object):
+    """Objects, camera and recorded motion of a single scene while it is stepped,
+    the scene may share the pybullet world with scenes of other collision groups"""
 
-    # # add plane
-    # plane_id = p.loadURDF("plane.urdf")
-    # p.changeDynamics(plane_id, -1, restitution=0)
+    def __init__(self, config, collision_group=None, shapes=None, writer=None):
+        self.sim = sim = config.sim
+        self.preview_every = int((1 / sim.preview_fps) // sim.timestep)
+        self.num_steps = int(sim.sim_time / sim.timestep)
 
-    # set up objects
-    om = ObjectManager(config, sim.obj_dir, num_steps)
+        # # add plane
+        # plane_id = p.loadURDF("plane.urdf")
+        # p.changeDynamics(plane_id, -1, restitution=0)
 
-    # set up camera
-    if sim.preview:
-        cam_params = {
-            'target_pos': [-1.5, 0, 0],
-            'pitch': -20.0,
-            'yaw': 90,
-            'roll': 0,
-            'cam_dist': 7.2,
-            'width': 480,
-            'height': 320,
-            'up_axis': 2,
-            'near_plane': 0.01,
-            'far_plane': 100,
-            'fov': 32
-        }
-        camera = Camera(**cam_params)
-    else:
-        camera = None
+        # set up objects
+        self.om = ObjectManager(config, sim.obj_dir, self.num_steps, shapes=shapes)
+        if collision_group is not None:
+            self.om.set_collision_group(collision_group)
 
-    # run simulation
+        # set up camera
+        if sim.preview:
+            cam_params = {
+                'target_pos': [-1.5, 0, 0],
+                'pitch': -20.0,
+                'yaw': 90,
+                'roll': 0,
+                'cam_dist': 7.2,
+                'width': 480,
+                'height': 320,
+                'up_axis': 2,
+                'near_plane': 0.01,
+                'far_plane': 100,
+                'fov': 32
+            }
+            self.camera = Camera(**cam_params)
+            self.preview = PreviewWriter(sim, self.camera)
+        else:
+            self.camera = None
+            self.preview = None
 
-    motion = []
-    valid = True
-    if sim.step_pattern is None:
-        step_pattern = np.ones(num_steps)
-    else:
-        step_pattern = convert_step_patterns(sim.step_pattern)
-
-    for i in range(num_steps):
-        if om.has_collision():
-            valid = False
-        for obj_id in om.object_ids:
-            om.set_object_motion(obj_id, i)
-        for link_id in range(om.num_link):
-            om.set_occluder_motion(link_id, i)
-
-        object_motions = []
-        occluder_motions = []
-        desk_motions = []
-        if om.has_collision():
-            valid = False
-        for obj_id in om.object_ids:
-            object_motions.append(om.get_object_motion(obj_id))
+        self.capture = MotionCapture(self.om, self.num_steps, sim.get("record_every", 1), writer,
+                                     sim.get("motion_chunk", 0))
+        self.collision_step = None
+        self.collision_bodies = []
+        self.steps_run = 0
+        self.done = self.num_steps == 0
+        if sim.step_pattern is None:
+            self.step_pattern = np.ones(self.num_steps)
+        else:
+            self.step_pattern = convert_step_patterns(sim.step_pattern)
+
+    @property
+    def needs_contacts(self):
+        """Contacts are only checked until the first collision"""
+        return not self.done and self.collision_step is None
+
+    def record(self, i, contacts):
+        """Set and record the motion of step i, given the contact snapshot of the step,
+        return whether stepSimulation should be called after it"""
+        sim, om = self.sim, self.om
+        self.steps_run = i + 1
+        # bodies only move in stepSimulation, or when objects appear or disappear and occluders are set,
+        # so the previous record is reused for whatever did not move since
+        stepped = i == 0 or bool(self.step_pattern[i - 1])
+        object_event = om.has_object_event(i)
+        occluder_events = [om.has_occluder_event(link_id, i) for link_id in range(om.num_link)]
+        # objects only move before stepping if they appear or disappear
+        if self.collision_step is None and object_event:
+            self.collision_bodies = contacts.colliding_bodies(om.object_ids, om.get_object_locations())
+            if len(self.collision_bodies) > 0:
+                self.collision_step = i
+        if self.collision_step is not None and sim.early_abort:
+            self.done = True
+            return False
+        if object_event:
+            for obj_id in om.object_ids:
+                om.set_object_motion(obj_id, i)
         for link_id in range(om.num_link):
-            occluder_motions.append(om.get_occluder_motion(link_id))
-        for desk_id in om.desk_ids:
-            desk_motions.append(om.get_desk_motion(desk_id))
-        if i % preview_every == 0 and sim.preview:
-            img = camera.take_pic()
-            save_path = os.path.join(sim.output_dir, 'imgs',
-                                     '%s_%06.2fs.png' % (sim.img_name_prefix, i * sim.timestep))
-            print('| saving to %s' % save_path)
-            imageio.imsave(save_path, img)
-        motion.append(dict(objects=object_motions, occluders=occluder_motions, desks=desk_motions))
-        if om.has_collision():
-            valid = False
-        if step_pattern[i]:
+            # joints drift in stepSimulation, and are set back to the pattern
+            if stepped or occluder_events[link_id]:
+                om.set_occluder_motion(link_id, i)
+
+        # an occluder that is set to the same joint position is recorded the same
+        self.capture.record(i, stepped or object_event, any(occluder_events), stepped)
+        # contacts and locations are unchanged since the previous check otherwise
+        if self.collision_step is None and (stepped or object_event):
+            self.collision_bodies = contacts.colliding_bodies(om.object_ids, self.capture.get_object_locations())
+            if len(self.collision_bodies) > 0:
+                self.collision_step = i
+                if sim.early_abort:
+                    # the motion of a step is only kept once it is checked
+                    self.capture.pop()
+                    self.done = True
+                    return False
+        if i % self.preview_every == 0 and sim.preview:
+            self.preview.write(i)
+        self.done = i + 1 == self.num_steps
+        return bool(self.step_pattern[i])
+
+    def result(self, setup_time, step_time):
+        """Motion, validity and timings of the scene, as returned by simulate"""
+        if self.preview is not None:
+            self.preview.close()
+        aborted = self.capture.num_steps < self.num_steps
+        if aborted and self.capture.writer is not None:
+            # aborted motion is never saved
+            self.capture.writer.discard()
+            motion = None
+        else:
+            motion = self.capture.to_trace(self.sim.timestep)
+        return SimResult(motion=motion, valid=self.collision_step is None,
+                         num_steps=self.num_steps, steps_run=self.steps_run, aborted=aborted,
+                         collision_step=self.collision_step, collision_bodies=self.collision_bodies,
+                         setup_time=setup_time, step_time=step_time)
+
+
+def simulate(config, writer=None):
+    """Build the scene of config in the connected pybullet world and run it,
+    return the motion, the validity and the time spent on setup and on stepping.
+    With sim.early_abort, stop at the first step with a collision.
+    With a TraceWriter, the motion is written out in chunks of sim.motion_chunk recorded steps,
+    and the result has no motion"""
+    setup_start = time.time()
+    setup_world(config.sim)
+    scene = SceneSimulation(config, writer=writer)
+
+    # run simulation
+    step_start = time.time()
+    for i in range(scene.num_steps):
+        # contact points only change in stepSimulation, so one snapshot serves the whole step,
+        # and there is nothing left to check once a collision is found
+        if scene.needs_contacts:
+            contacts = ContactSnapshot()
+        if scene.record(i, contacts):
             p.stepSimulation()
+        if scene.done:
+            break
+
+    step_end = time.time()
+    return scene.result(step_start - setup_start, step_end - step_start)
+
 
-    save_path = os.path.join(sim.output_dir, "motion.json")
-    output_file = {
-        'timestep': sim.timestep,
-        'motion': motion
-    }
+def save_motion(sim, motion):
+    """Save the motion trace of a simulation to the output directory, as motion.npz or motion.json,
+    as keyframes within sim.motion_max_error if it is set"""
+    save_path = os.path.join(sim.output_dir, "motion.%s" % sim.motion_format)
     print('| saving motion file to %s' % save_path)
-    write_serialized(output_file, save_path)
+    write_trace(motion, save_path, sim.get("motion_max_error"))
+
+
+def get_writer(sim):
+    """TraceWriter of motion.npz if the motion is written out in chunks while stepping,
+    which keyframes need the whole motion for"""
+    if sim.get("motion_chunk", 0) > 0 and sim.motion_format == "npz" and sim.get("motion_max_error") is None:
+        save_path = os.path.join(sim.output_dir, "motion.npz")
+        print('| writing motion file to %s' % save_path)
+        return TraceWriter(save_path)
+    return None
+
+
+def main(config):
+    sim = config.sim
+    prepare_output(sim)
+
+    physicsClient = p.connect(p.DIRECT)
+    result = simulate(config, get_writer(sim))
+    # motion that was written out while stepping is saved already
+    if not result.aborted and result.motion is not None:
+        save_motion(sim, result.motion)
 
     p.disconnect()
     print('| finish')
-    if not valid:
-        print("Collision detected!")
-    return valid
+    if not result.valid:
+        print("Collision detected at step %d involving bodies %s!" %
+              (result.collision_step, result.collision_bodies))
+    return result
 
 
 if __name__ == '__main__':
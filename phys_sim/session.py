@@ -0,0 +1,72 @@
+'''
+simulate many scenes in one persistent pybullet client
+'''
+
+import time
+
+import pybullet as p
+
+from phys_sim.packing import iter_packs, simulate_packed
+from phys_sim.run_sim import simulate, prepare_output, save_motion
+
+
+class SimSession(object):
+    """A pybullet client that is connected once and reset between scenes,
+    instead of connecting and disconnecting for every case"""
+
+    def __init__(self):
+        self.client = p.connect(p.DIRECT)
+        self.num_scenes = 0
+
+    def simulate(self, config):
+        """Simulate a single config, return its result as in run_sim.simulate,
+        the reset of the previous scene is counted as setup time"""
+        reset_start = time.time()
+        if self.num_scenes > 0:
+            p.resetSimulation()
+        reset_time = time.time() - reset_start
+        result = simulate(config)
+        result.setup_time += reset_time
+        self.num_scenes += 1
+        return result
+
+    def simulate_packed(self, configs):
+        """Simulate configs side by side in one world, return their results as in packing.simulate_packed"""
+        reset_start = time.time()
+        if self.num_scenes > 0:
+            p.resetSimulation()
+        reset_time = (time.time() - reset_start) / len(configs)
+        results = simulate_packed(configs)
+        for result in results:
+            result.setup_time += reset_time
+        self.num_scenes += len(configs)
+        return results
+
+    def run(self, configs, save=False, pack_size=1):
+        """Simulate an iterable of configs and yield one result per config,
+        optionally saving each motion to its output directory.
+        With pack_size > 1, consecutive configs that can be stepped together are packed into one world,
+        which only applies to configs with sim.early_abort"""
+        for pack in iter_packs(configs, pack_size):
+            if save:
+                for config in pack:
+                    prepare_output(config.sim)
+            if len(pack) == 1:
+                results = [self.simulate(pack[0])]
+            else:
+                results = self.simulate_packed(pack)
+            for config, result in zip(pack, results):
+                if save and not result.aborted:
+                    save_motion(config.sim, result.motion)
+                print('| {}: setup {:.3f}s, steps {:.3f}s'.format(config.sim.img_name_prefix,
+                                                                 result.setup_time, result.step_time))
+                yield result
+
+    def close(self):
+        p.disconnect(self.client)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
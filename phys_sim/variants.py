@@ -0,0 +1,170 @@
+'''
+simulate variants of a case once up to the step where they diverge, and branch each variant from a saved state
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pybullet as p
+
+from phys_sim.contacts import ContactSnapshot
+from phys_sim.prescreen import get_joint_pattern
+from phys_sim.run_sim import SceneSimulation, SimResult, setup_world, prepare_output, save_motion
+
+# keys that do not change the simulation
+RENDER_KEYS = ("color", "material")
+# keys that only change the simulation from the step they refer to
+SCHEDULE_KEYS = ("appear_time", "disappear_time", "joint_pattern")
+
+
+def get_structure(config):
+    """Everything of a config that has to be equal for two scenes to share a prefix"""
+    sim = config.sim
+    entities = {}
+    for group in ("objects", "occluders", "desks"):
+        entities[group] = [{k: v for k, v in entity.items() if k not in RENDER_KEYS + SCHEDULE_KEYS}
+                           for entity in config.get(group, [])]
+    return json.dumps(dict(timestep=sim.timestep, step_pattern=sim.step_pattern, early_abort=sim.early_abort,
+                           record_every=sim.get("record_every", 1), use_primitives=sim.get("use_primitives", 0),
+                           **entities), sort_keys=True)
+
+
+def get_object_divergence(object_1, object_2):
+    """First step at which ObjectManager.set_object_motion treats two objects differently"""
+    appear_1, appear_2 = object_1.get("appear_time", 0), object_2.get("appear_time", 0)
+    disappear_1, disappear_2 = object_1.get("disappear_time", 100000), object_2.get("disappear_time", 100000)
+    steps = []
+    if (appear_1 != 0) != (appear_2 != 0):
+        # objects that appear later are moved away at step 0
+        steps.append(0)
+    elif appear_1 != appear_2:
+        steps.append(min(appear_1, appear_2))
+    if disappear_1 != disappear_2:
+        steps.append(min(disappear_1, disappear_2))
+    return min(steps, default=None)
+
+
+def get_divergence_step(config_1, config_2):
+    """Number of steps two configs are simulated identically, or None if they build different worlds"""
+    if config_1.sim.preview or config_2.sim.preview or get_structure(config_1) != get_structure(config_2):
+        return None
+    num_steps = min(int(config.sim.sim_time / config.sim.timestep) for config in (config_1, config_2))
+    steps = [num_steps]
+    for object_1, object_2 in zip(config_1.objects, config_2.objects):
+        steps.append(get_object_divergence(object_1, object_2))
+    for occluder_1, occluder_2 in zip(config_1.get("occluders", []), config_2.get("occluders", [])):
+        pattern_1, pattern_2 = get_joint_pattern(occluder_1, num_steps), get_joint_pattern(occluder_2, num_steps)
+        length = min(len(pattern_1), len(pattern_2))
+        different = np.flatnonzero(pattern_1[:length] != pattern_2[:length])
+        steps.append(different[0] if len(different) > 0 else length)
+    return int(min(step for step in steps if step is not None))
+
+
+class BranchPoint(object):
+    """State of the world at the start of a step, saved to a .bullet file,
+    with the motion capture and the collision checks recorded up to that step"""
+
+    def __init__(self, scene, step, state_file):
+        p.saveBullet(state_file)
+        self.state_file = state_file
+        self.step = step
+        self.contacts = ContactSnapshot()
+        self.capture = scene.capture.copy(scene.om, scene.num_steps)
+        self.collision_step = scene.collision_step
+        self.collision_bodies = scene.collision_bodies
+
+    def restore(self, scene):
+        """Continue a scene built in a fresh world from this branch point"""
+        p.restoreState(fileName=self.state_file)
+        scene.capture = self.capture.copy(scene.om, scene.num_steps)
+        scene.collision_step = self.collision_step
+        scene.collision_bodies = self.collision_bodies
+        scene.steps_run = self.step
+        # a scene that ends at the branch point, or stopped at a collision before it, has no steps left
+        scene.done = self.step >= scene.num_steps or (self.collision_step is not None and scene.sim.early_abort)
+
+
+def simulate_branch(configs, indices, results, state_dir, branch_point=None):
+    """Simulate configs[indices[0]] from the branch point, or from scratch, and save a branch point
+    at every step where another config of indices diverges from it, then simulate those from their branch points"""
+    lead = indices[0]
+    start = 0 if branch_point is None else branch_point.step
+    branches = {}
+    for i in indices[1:]:
+        step = get_divergence_step(configs[lead], configs[i])
+        branches.setdefault(start if step is None else max(step, start), []).append(i)
+
+    setup_start = time.time()
+    p.resetSimulation()
+    setup_world(configs[lead].sim)
+    scene = SceneSimulation(configs[lead])
+    if branch_point is not None:
+        branch_point.restore(scene)
+        contacts = branch_point.contacts
+
+    step_start = time.time()
+    branch_points = {start: branch_point}
+    step = start
+    while True:
+        # after a collision with early abort, the world is not at the start of the step
+        if step in branches and step not in branch_points and scene.capture.num_steps == step:
+            state_file = os.path.join(state_dir, "{}_{}.bullet".format(lead, step))
+            branch_points[step] = BranchPoint(scene, step, state_file)
+        if scene.done:
+            break
+        if scene.needs_contacts and (step > start or branch_point is None):
+            contacts = ContactSnapshot()
+        if scene.record(step, contacts):
+            p.stepSimulation()
+        step += 1
+    step_end = time.time()
+    results[lead] = scene.result(step_start - setup_start, step_end - step_start)
+
+    for step, branch in sorted(branches.items()):
+        if step in branch_points:
+            simulate_branch(configs, branch, results, state_dir, branch_points[step])
+        else:
+            # the lead stopped at a collision before the branch diverges, and so do the configs of the branch
+            for i in branch:
+                lead_result = results[lead]
+                results[i] = SimResult(motion=lead_result.motion, valid=lead_result.valid,
+                                       num_steps=int(configs[i].sim.sim_time / configs[i].sim.timestep),
+                                       steps_run=lead_result.steps_run, aborted=True,
+                                       collision_step=lead_result.collision_step,
+                                       collision_bodies=lead_result.collision_bodies, setup_time=0., step_time=0.)
+
+
+def simulate_variants(configs):
+    """Simulate configs in the connected pybullet world, sharing the steps they have in common,
+    return one result per config as in run_sim.simulate"""
+    results = [None] * len(configs)
+    state_dir = tempfile.mkdtemp(prefix="phys_sim_states_")
+    try:
+        simulate_branch(configs, list(range(len(configs))), results, state_dir)
+    finally:
+        shutil.rmtree(state_dir)
+    return results
+
+
+def main(configs):
+    """Simulate variants of a case and save the motion of each, as run_sim.main does for a single config"""
+    for config in configs:
+        prepare_output(config.sim)
+
+    p.connect(p.DIRECT)
+    results = simulate_variants(configs)
+    for config, result in zip(configs, results):
+        if not result.aborted:
+            save_motion(config.sim, result.motion)
+
+    p.disconnect()
+    print('| finish')
+    for config, result in zip(configs, results):
+        if not result.valid:
+            print("Collision detected in %s at step %d involving bodies %s!" %
+                  (config.case_name, result.collision_step, result.collision_bodies))
+    return results
@@ -0,0 +1,28 @@
+import os
+import bpy
+
+from easydict import EasyDict
+
+from render.run_render import build_scene
+from utils.misc import BlenderArgumentParser
+
+
+def parse_args():
+    parser = BlenderArgumentParser(description='')
+    parser.add_argument('--base_scene', help='base scene to build the template from', type=str,
+                        default='render/data/base_scene.blend')
+    parser.add_argument('--material_dir', type=str, default='render/data/materials')
+    parser.add_argument('--output', help='template to save', type=str, default='render/data/template.blend')
+    return parser.parse_args()
+
+
+def make_template(rendering, out_path):
+    """Save the scene every case is rendered in, for run_render to open instead of building it"""
+    build_scene(rendering)
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(out_path))
+    print("{} generated".format(out_path))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    make_template(EasyDict(base_scene_blendfile=args.base_scene, material_dir=args.material_dir), args.output)
@@ -6,7 +6,6 @@ from PIL import Image
 from imageio import imread
 
 from render.camera import set_camera
-from utils.geometry import convert_euler
 
 
 def get_intro_camera(rendering, n):
@@ -28,10 +27,12 @@ def get_intro_camera(rendering, n):
     return phi_s, theta_s
 
 
-def render_intro(om, rendering, m):
+def render_intro(om, rendering, trace):
     render_args = bpy.context.scene.render
     time_step = 1 / rendering.fps
     phi_s, theta_s = get_intro_camera(rendering, int(rendering.intro_time * rendering.fps))
+    locations = trace.entities("location")
+    quaternions = trace.entities("quaternion")
     for n in range(int(rendering.intro_time * rendering.fps)):
         if "ABORT" in globals():
             if globals()["ABORT"]:
@@ -40,20 +41,9 @@ def render_intro(om, rendering, m):
 
         set_camera(rendering.camera_rho, theta_s[n], phi_s[n], look_at=rendering.camera_look_at)
 
-        # objects are before occluders
-        for i, obj_motion in enumerate(m["objects"] + m["occluders"]):
-            loc = obj_motion['location']
-            euler = convert_euler(obj_motion['orientation'])
-            om.set_position(om.obj_names[i], loc, euler)
-
-        i = len(m["objects"]) + len(m["occluders"])
-
-        for desk_motion in m["desks"]:
-            for obj_motion in desk_motion:
-                loc = obj_motion['location']
-                euler = convert_euler(obj_motion['orientation'])
-                om.set_position(om.obj_names[i], loc, euler)
-                i += 1
+        # objects are before occluders, which are before desks
+        for i in range(len(locations)):
+            om.set_position(om.obj_names[i], locations[i, 0], quaternions[i, 0], rotation_mode='QUATERNION')
 
         image_path = os.path.join(rendering.output_dir, 'imgs',
                                   '%s_-%05.2fs.png' % (rendering.image_prefix, n * time_step))
@@ -1,4 +1,3 @@
-import re
 from copy import copy
 import os
 
@@ -8,20 +7,23 @@ import numpy as np
 
 from utils.geometry import convert_euler, deg2rad
 from utils.constants import COLORS, TYPES, OCCLUDER_HALF_WIDTH
-from utils.shape_net import SHAPE_DIMENSIONS, get_shape_blend
+from utils.shape_net import SHAPE_DIMENSIONS
+from render.shapes import ShapeLibrary
 
 
 class ObjectManager(object):
 
-    def __init__(self, config, shape_dir, material_dir, back_wall):
+    def __init__(self, config, shape_dir, material_dir, back_wall, library=None):
         self.shape_dir = shape_dir
         self.material_dir = material_dir
+        self.library = library if library is not None else ShapeLibrary(shape_dir)
+        self.shape_counts = {}
         self.obj_names = []
         self.mask_nodes = []
         self.shapes = []
         self.scales = []
         self.colors = []
-        self.load_materials()
+        self.load_materials(material_dir)
 
         self.color_name_to_rgba = {}
         for name, rgb in COLORS.items():
@@ -66,30 +68,16 @@ class ObjectManager(object):
             self.add_material(desk_name, material, color)
 
     def add_object(self, shape, scale, loc, euler, color, counted=True):
-        # First figure out how many of this object are already in the scene so we can
-        # give the new object a unique name
-
-        count = 0
-        if counted:
-            for obj in bpy.data.objects:
-                if obj.name.startswith(shape):
-                    count += 1
-        if re.match("^\d\d\d\d\d\d\d\d\d\d$", shape):
-            filename = get_shape_blend(shape)
-        else:
-            filename = os.path.join(self.shape_dir, '%s.blend' % shape, 'Object', shape)
-        bpy.ops.wm.append(filename=filename)
-
-        # Give it a new name to avoid conflicts
+        # Name the object by how many of this shape were added before
         if counted:
+            count = self.shape_counts.get(shape, 0)
+            self.shape_counts[shape] = count + 1
             new_name = '%s_%d' % (shape, count)
         else:
             new_name = 'back_wall'
-        bpy.data.objects[shape].name = new_name
 
-        # Set the new object as active, then rotate, scale, and translate it
-        bpy.context.view_layer.objects.active = bpy.data.objects[new_name]
-        bpy.ops.transform.resize(value=scale)
+        # Copy the object from the library with its scale, then rotate and translate it
+        new_name = self.library.new_object(shape, new_name, scale).name
         self.set_position(new_name, loc, euler)
 
         if counted:
@@ -116,29 +104,63 @@ class ObjectManager(object):
             loc[0], loc[1], loc[2] + scale[2] * 2 + OCCLUDER_HALF_WIDTH), convert_euler(euler), color))
         return names
 
-    def set_position(self, name, loc, euler, key_frame=False):
+    def set_position(self, name, loc, rotation, key_frame=False, rotation_mode='XYZ'):
+        """Set the location and the rotation of an object, the rotation is euler angles,
+        or a quaternion (x, y, z, w) as in pybullet with rotation_mode QUATERNION"""
         bpy.context.view_layer.objects.active = bpy.data.objects[name]
-        bpy.context.object.rotation_mode = 'XYZ'
-        bpy.context.object.rotation_euler = euler
+        bpy.context.object.rotation_mode = rotation_mode
+        if rotation_mode == 'QUATERNION':
+            # blender quaternions are (w, x, y, z)
+            bpy.context.object.rotation_quaternion = (rotation[3], rotation[0], rotation[1], rotation[2])
+            rotation_path = "rotation_quaternion"
+        else:
+            bpy.context.object.rotation_euler = rotation
+            rotation_path = "rotation_euler"
         bpy.context.object.location = loc
         if key_frame:
             bpy.context.object.keyframe_insert('location', group="LocRot")
-            bpy.context.object.keyframe_insert("rotation_euler", group="LocRot")
-
-    def load_materials(self):
+            bpy.context.object.keyframe_insert(rotation_path, group="LocRot")
+
+    def set_motion(self, frames, locations, quaternions):
+        """Keyframe objects at all frames at once, as set_position with key_frame does for one frame, with
+        locations of shape (objects, frames, 3) and quaternions (x, y, z, w) of shape (objects, frames, 4)"""
+        frames = np.asarray(frames, dtype=np.float32)
+        for i in range(len(locations)):
+            obj = bpy.data.objects[self.obj_names[i]]
+            obj.rotation_mode = 'QUATERNION'
+            if obj.animation_data is None:
+                obj.animation_data_create()
+            action = bpy.data.actions.new(obj.name + "Action")
+            obj.animation_data.action = action
+            # blender quaternions are (w, x, y, z)
+            channels = [("location", j, locations[i, :, j]) for j in range(3)] + \
+                       [("rotation_quaternion", j, quaternions[i, :, (3, 0, 1, 2)[j]]) for j in range(4)]
+            for data_path, index, values in channels:
+                fcurve = action.fcurves.new(data_path, index=index, action_group="LocRot")
+                fcurve.keyframe_points.add(len(frames))
+                # keyframe points are (frame, value) pairs
+                co = np.stack([frames, values], axis=1).astype(np.float32)
+                fcurve.keyframe_points.foreach_set("co", co.ravel())
+                fcurve.update()
+
+    @staticmethod
+    def load_materials(material_dir):
         """
         Load materials from a directory. We assume that the directory contains .blend
         files with one material each. The file X.blend has a single NodeTree item named
         X; this NodeTree item must have a "Color" input that accepts an RGBA value.
+        Materials already loaded in the session are not appended again.
         """
-        for fn in os.listdir(self.material_dir):
+        for fn in os.listdir(material_dir):
             if not fn.endswith('.blend'):
                 continue
             name = os.path.splitext(fn)[0]
-            file_name = os.path.join(self.material_dir, fn, 'NodeTree', name)
+            if name in bpy.data.node_groups:
+                continue
+            file_name = os.path.join(material_dir, fn, 'NodeTree', name)
             bpy.ops.wm.append(filename=file_name)
             if name == "rubber":
-                file_name = os.path.join(self.material_dir, fn, 'NodeTree', "rubber_combine")
+                file_name = os.path.join(material_dir, fn, 'NodeTree', "rubber_combine")
                 bpy.ops.wm.append(filename=file_name)
 
     def add_material(self, obj_name, name, color, split=(0, 0, 0)):
@@ -161,11 +183,13 @@ class ObjectManager(object):
         mat = bpy.data.materials['Material']
         mat.name = 'Material_%d' % mat_count
 
-        # Attach the new material to the active object
+        # Attach the new material to the active object, in the slot of the object rather than
+        # of the mesh, which objects of the same shape share
         # Make sure it doesn't already have materials
         obj = bpy.context.active_object
-        assert len(obj.data.materials) == 0
-        obj.data.materials.append(mat)
+        assert len(obj.material_slots) == 1 and obj.material_slots[0].material is None
+        obj.material_slots[0].link = 'OBJECT'
+        obj.material_slots[0].material = mat
 
         # Find the output node of the new material
         output_node = None
@@ -202,7 +226,8 @@ class ObjectManager(object):
         )
 
     def log(self, id, motion, mask):
-        """log the motion of object id into log"""
+        """log the motion of object id into log, motion is a dict of MotionTrace.entity_motion,
+        with euler angles derived from the quaternion of the trace"""
         bpy.context.view_layer.objects.active = bpy.data.objects[self.obj_names[id]]
         obj_mask = np.asarray(mask, dtype=np.uint8, order="F")
         mask_code = mask_util.encode(obj_mask)
@@ -210,6 +235,6 @@ class ObjectManager(object):
         scale = [x * y for x, y in zip(self.scales[id], SHAPE_DIMENSIONS[self.shapes[id]])]
         shape = "Occluder" if self.scales[id][0] == OCCLUDER_HALF_WIDTH else TYPES[self.shapes[id]]
         return dict(mask=mask_code, name=self.obj_names[id], type=shape, scale=scale,
-                    location=motion["location"], rotation=convert_euler(motion["orientation"]),
-                    velocity=motion["velocity"], angular_velocity=convert_euler(motion["angular_velocity"]),
+                    location=motion["location"], rotation=motion["orientation"],
+                    velocity=motion["velocity"], angular_velocity=motion["angular_velocity"],
                     color=self.colors[id])
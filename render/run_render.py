@@ -1,7 +1,8 @@
 import argparse
 import os
-import json
+import time
 import bpy
+import numpy as np
 
 from imageio import imread
 from PIL import Image
@@ -9,29 +10,99 @@ from PIL import Image
 from render.intro import render_intro
 from render.render_utils import *
 from render.objects import ObjectManager
-from render.ground import add_ground
+from render.ground import add_ground, adjust_ground
 from render.camera import set_camera
 
 from utils.io import mkdir, clr_dir, write_serialized
-from utils.geometry import convert_euler, convert_inverse_euler
+from utils.geometry import convert_inverse_euler
+from utils.trace import iter_trace
 
 
-def main(config):
-    # main script
-    rendering = config.rendering
-    mkdir(rendering.output_dir)
-    mkdir(os.path.join(rendering.output_dir, 'imgs'))
-    mkdir(os.path.join(rendering.output_dir, 'masks'))
-    mkdir(os.path.join(rendering.output_dir, 'depths'))
-    mkdir(os.path.join(rendering.output_dir, 'flows'))
-    clr_dir(os.path.join(rendering.output_dir, 'imgs'))
-    clr_dir(os.path.join(rendering.output_dir, 'masks'))
-    clr_dir(os.path.join(rendering.output_dir, 'depths'))
-    clr_dir(os.path.join(rendering.output_dir, 'flows'))
+def iter_frames(motion_file, fps):
+    """Chunks of a motion trace, read one at a time, with the frames to render from each as pairs of
+    a step of the chunk and the physics step it was recorded at, which frames are indexed by"""
+    for chunk in iter_trace(motion_file):
+        render_every = int(1 / chunk.timestep / fps)
+        if render_every == 0:
+            render_every = 1
+        if render_every % chunk.record_every != 0:
+            raise ValueError("motion recorded every {} steps cannot be rendered every {} steps"
+                             .format(chunk.record_every, render_every))
+        stride = render_every // chunk.record_every
+        first_step = chunk.header.get("first_step", 0)
+        yield chunk, [(k - first_step, k * chunk.record_every)
+                      for k in range(-(-first_step // stride) * stride, first_step + chunk.num_steps, stride)]
 
+
+def build_scene(rendering):
+    """Open the base scene, and add what every case shares: the ground material, the material node groups,
+    the object index pass and the compositor nodes, returned as the output nodes of masks, depths and flows"""
     add_ground(rendering)
+    ObjectManager.load_materials(rendering.material_dir)
+    bpy.context.scene.use_nodes = True
+    bpy.context.view_layer.use_pass_object_index = True
+
+    mask_node = set_mask("")
+    mask_node.name = "masks"
+    depth_node = set_depth("")
+    depth_node.name = "depths"
+    flow_node = set_flow("")
+    for ch in "RGBA":
+        flow_node[ch].name = "flows_%s" % ch
+    return mask_node, depth_node, flow_node
+
+
+def is_template_current(rendering):
+    """Whether the template exists and was built after the base scene and the materials last changed"""
+    if not os.path.exists(rendering.template_blendfile):
+        return False
+    sources = [rendering.base_scene_blendfile] + [os.path.join(rendering.material_dir, fn)
+                                                  for fn in os.listdir(rendering.material_dir)]
+    return os.path.getmtime(rendering.template_blendfile) >= max(os.path.getmtime(fn) for fn in sources)
+
+
+def load_scene(rendering):
+    """The scene of build_scene, opened from the template built by render/data/builder/make_template.py
+    if it is up to date, with the ground rotated at random for the case"""
+    if not is_template_current(rendering):
+        print("| no up to date template at %s, building the scene" % rendering.template_blendfile)
+        return build_scene(rendering)
+    bpy.ops.wm.open_mainfile(filepath=rendering.template_blendfile)
+    adjust_ground()
+    nodes = bpy.context.scene.node_tree.nodes
+    return nodes["masks"], nodes["depths"], {ch: nodes["flows_%s" % ch] for ch in "RGBA"}
+
 
-    # set up render parameters
+def set_output_paths(rendering, mask_node, depth_node, flow_node):
+    """Point the compositor outputs to the folders of a case"""
+    mask_node.base_path = os.path.join(rendering.output_dir, "masks")
+    depth_node.base_path = os.path.join(rendering.output_dir, "depths")
+    for ch in "RGBA":
+        flow_node[ch].base_path = os.path.join(rendering.output_dir, "flows")
+
+
+def load_motion(om, motion_file, fps):
+    """Keyframe the objects at every frame to render, reading the motion one chunk at a time"""
+    frames, locations, quaternions = [], [], []
+    for chunk, chunk_frames in iter_frames(motion_file, fps):
+        steps = [k for k, _ in chunk_frames]
+        frames.extend(n for _, n in chunk_frames)
+        # objects are before occluders, which are before desks
+        locations.append(chunk.entities("location")[:, steps])
+        quaternions.append(chunk.entities("quaternion")[:, steps])
+    om.set_motion(frames, np.concatenate(locations, axis=1), np.concatenate(quaternions, axis=1))
+
+
+def prepare_output(rendering):
+    """Make the output folders of a case, and clear what an earlier render left in them"""
+    mkdir(rendering.output_dir)
+    for folder in ['imgs', 'masks', 'depths', 'flows']:
+        mkdir(os.path.join(rendering.output_dir, folder))
+        clr_dir(os.path.join(rendering.output_dir, folder))
+
+
+def set_render_args(rendering):
+    """Set up render parameters"""
     render_args = bpy.context.scene.render
     render_args.engine = 'CYCLES'
     render_args.resolution_x = rendering.width
@@ -58,14 +129,9 @@ def main(config):
     if rendering.use_gpu == 1:
         bpy.context.scene.cycles.device = 'GPU'
 
-    bpy.context.scene.use_nodes = True
-    bpy.context.view_layer.use_pass_object_index = True
-
-    # set up camera
-    set_camera(rendering.camera_rho, rendering.camera_theta, rendering.camera_phi,
-               look_at=rendering.camera_look_at)
 
-    # apply jitter to lamp positions
+def jitter_lights(rendering):
+    """Apply jitter to lamp positions"""
     if rendering.key_light_jitter > 0:
         for i in range(3):
             bpy.data.objects['Lamp_Key'].location[i] += rand_jitter(rendering.key_light_jitter)
@@ -76,78 +142,134 @@ def main(config):
         for i in range(3):
             bpy.data.objects['Lamp_Fill'].location[i] += rand_jitter(rendering.fill_light_jitter)
 
-    # set up objects
-    om = ObjectManager(config, rendering.shape_dir, rendering.material_dir, rendering.back_wall)
 
-    mask_node = set_mask(os.path.join(rendering.output_dir, "masks"))
-    depth_node = set_depth(os.path.join(rendering.output_dir, "depths"))
-    flow_node = set_flow(os.path.join(rendering.output_dir, "flows"))
+def render_animation(rendering, mask_node, depth_node, flow_node):
+    """Render every frame in a single animation render with persistent data, so that the scene is synced
+    once rather than for each frame, and rename the images, masks, depths and flows to the names of rendering
+    frames one at a time. Returns the seconds spent rendering"""
+    times = {}
+    for chunk, frames in iter_frames(rendering.motion_file, rendering.fps):
+        for _, n in frames:
+            times[n] = n * chunk.timestep
+    steps = sorted(times)
+    render_every = steps[1] - steps[0] if len(steps) > 1 else 1
+    if steps != list(range(steps[0], steps[-1] + 1, render_every)):
+        raise ValueError("frames to render are not evenly spaced")
+    if "ABORT" in globals():
+        if globals()["ABORT"]:
+            print("Aborted")
+            raise KeyboardInterrupt
+
+    scene = bpy.context.scene
+    scene.frame_start = steps[0]
+    scene.frame_end = steps[-1]
+    scene.frame_step = render_every
+    scene.render.use_persistent_data = True
+    # outputs are named by frame while rendering
+    frame_name = '%s_####.png' % rendering.image_prefix
+    scene.render.filepath = os.path.join(rendering.output_dir, 'imgs', frame_name)
+    mask_node.file_slots[0].path = frame_name
+    depth_node.file_slots[0].path = frame_name
+    for ch in "RGBA":
+        flow_node[ch].file_slots[0].path = '%s_%s' % (ch, frame_name)
 
-    # load motion
-    with open(rendering.motion_file, 'r') as f:
-        input_file = json.load(f)
-        time_step = float(input_file['timestep'])
-        motion = input_file['motion']
+    start = time.time()
+    bpy.ops.render.render(animation=True)
+    sampling_time = time.time() - start
 
-    # render it
-    render_every = int(1 / time_step / rendering.fps)
-    if render_every == 0:
-        render_every = 1
+    for n in steps:
+        frame_name = '%s_%04d.png' % (rendering.image_prefix, n)
+        name = '%s_%06.2fs.png' % (rendering.image_prefix, times[n])
+        os.replace(os.path.join(rendering.output_dir, 'imgs', frame_name),
+                   os.path.join(rendering.output_dir, 'imgs', name))
+        for folder in ['masks', 'depths']:
+            os.replace(os.path.join(rendering.output_dir, folder, frame_name),
+                       os.path.join(rendering.output_dir, folder, '%04d_%s' % (n, name)))
+        for ch in "RGBA":
+            os.replace(os.path.join(rendering.output_dir, 'flows', '%s_%s' % (ch, frame_name)),
+                       os.path.join(rendering.output_dir, 'flows', '%s_%04d_%s' % (ch, n, name)))
+    return sampling_time
+
+
+def render_case(config, om, mask_node, depth_node, flow_node):
+    """Render the motion of a case with its objects already in the scene, save the scene and the annotations,
+    and return the seconds spent rendering images"""
+    rendering = config.rendering
+    render_args = bpy.context.scene.render
+    sampling_time = 0.
 
     camera = dict(camera_rho=rendering.camera_rho, camera_theta=rendering.camera_theta,
                   camera_phi=rendering.camera_phi, camera_look_at=rendering.camera_look_at)
     scene_anns = dict(case_name=config.case_name, camera=camera, scene=[])
 
+    # load motion one chunk at a time, and render it
     if rendering.intro_time > 0:
-        render_intro(om, rendering, motion[0])
-
-    for n, m in enumerate(motion):
-        if n % render_every == 0:
-            bpy.context.scene.frame_set(n)
-            # objects are before occluders
-            for i, obj_motion in enumerate(m["objects"] + m["occluders"]):
-                loc = obj_motion['location']
-                euler = convert_euler(obj_motion['orientation'])
-                om.set_position(om.obj_names[i], loc, euler, key_frame=True)
-
-            i = len(m["objects"]) + len(m["occluders"])
-
-            for desk_motion in m["desks"]:
-                for obj_motion in desk_motion:
-                    loc = obj_motion['location']
-                    euler = convert_euler(obj_motion['orientation'])
-                    om.set_position(om.obj_names[i], loc, euler, key_frame=True)
-                    i += 1
-
-    for n, m in enumerate(motion):
-        if "ABORT" in globals():
-            if globals()["ABORT"]:
-                print("Aborted")
-                raise KeyboardInterrupt
-
-        if n % render_every == 0:
-            bpy.context.scene.frame_set(n)
+        start = time.time()
+        render_intro(om, rendering, next(iter_trace(rendering.motion_file)))
+        sampling_time += time.time() - start
+
+    load_motion(om, rendering.motion_file, rendering.fps)
+    animation = rendering.get("render_animation", 0)
+    if animation:
+        sampling_time += render_animation(rendering, mask_node, depth_node, flow_node)
+
+    for chunk, frames in iter_frames(rendering.motion_file, rendering.fps):
+        time_step = chunk.timestep
+        annotated = [("objects", i) for i in range(chunk.count("objects"))] + \
+                    [("occluders", i) for i in range(chunk.count("occluders"))]
+        for k, n in frames:
             image_path = os.path.join(rendering.output_dir, 'imgs',
                                       '%s_%06.2fs.png' % (rendering.image_prefix, n * time_step))
-            render_args.filepath = image_path
             mask_base_name = '####_%s_%06.2fs.png' % (rendering.image_prefix, n * time_step)
-            mask_node.file_slots[0].path = mask_base_name
-            depth_base_name = '####_%s_%06.2fs.png' % (rendering.image_prefix, n * time_step)
-            depth_node.file_slots[0].path = depth_base_name
-            for ch in "RGBA":
-                flow_base_name = '%s_####_%s_%06.2fs.png' % (ch, rendering.image_prefix, n * time_step)
-                flow_node[ch].file_slots[0].path = flow_base_name
+            if not animation:
+                if "ABORT" in globals():
+                    if globals()["ABORT"]:
+                        print("Aborted")
+                        raise KeyboardInterrupt
 
-            bpy.ops.render.render(write_still=True)
+                bpy.context.scene.frame_set(n)
+                render_args.filepath = image_path
+                mask_node.file_slots[0].path = mask_base_name
+                depth_base_name = '####_%s_%06.2fs.png' % (rendering.image_prefix, n * time_step)
+                depth_node.file_slots[0].path = depth_base_name
+                for ch in "RGBA":
+                    flow_base_name = '%s_####_%s_%06.2fs.png' % (ch, rendering.image_prefix, n * time_step)
+                    flow_node[ch].file_slots[0].path = flow_base_name
+
+                start = time.time()
+                bpy.ops.render.render(write_still=True)
+                sampling_time += time.time() - start
 
             frame_anns = dict(image_path=image_path, objects=[])
             mask_file_path = os.path.join(rendering.output_dir, "masks", "{:04d}".format(n) + mask_base_name[4:])
-            for i, obj_motion in enumerate(m["objects"] + m["occluders"]):
+            for i, (group, index) in enumerate(annotated):
                 mask = imread(mask_file_path)[:, :, 0] == i + 1
-                frame_anns["objects"].append(om.log(i, obj_motion, mask))
+                frame_anns["objects"].append(om.log(i, chunk.entity_motion(group, index, k), mask))
 
             scene_anns["scene"].append(frame_anns)
 
-    bpy.ops.wm.save_as_mainfile(filepath=os.path.join(rendering.output_dir, "scene.blend"))
+    # a copy, so that a render worker keeps its session file
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.join(rendering.output_dir, "scene.blend"), copy=True)
     write_serialized(scene_anns, os.path.join(rendering.output_dir,
                                               "{:s}_ann.yaml".format(rendering.image_prefix)))
+    return sampling_time
+
+
+def main(config):
+    # main script
+    rendering = config.rendering
+    prepare_output(rendering)
+
+    mask_node, depth_node, flow_node = load_scene(rendering)
+    set_output_paths(rendering, mask_node, depth_node, flow_node)
+    set_render_args(rendering)
+
+    # set up camera
+    set_camera(rendering.camera_rho, rendering.camera_theta, rendering.camera_phi,
+               look_at=rendering.camera_look_at)
+    jitter_lights(rendering)
+
+    # set up objects
+    om = ObjectManager(config, rendering.shape_dir, rendering.material_dir, rendering.back_wall)
+
+    render_case(config, om, mask_node, depth_node, flow_node)
@@ -0,0 +1,49 @@
+import os
+import re
+
+import bpy
+import mathutils
+
+from utils.shape_net import get_shape_blend
+
+
+class ShapeLibrary(object):
+    """Meshes of the shapes in shape_dir or in the ShapeNet .blend files, each loaded once, with objects created
+    as copies linked to the same mesh. Materials are linked to each object rather than to the shared mesh.
+    Meshes are kept with a fake user, so that they outlive the objects of a case, and are loaded again
+    once another file is opened"""
+
+    def __init__(self, shape_dir):
+        self.shape_dir = shape_dir
+        self.meshes = {}
+        self.num_loaded = 0
+
+    def get_blend(self, shape):
+        if re.match("^\d\d\d\d\d\d\d\d\d\d$", shape):
+            # get_shape_blend gives the path of the object in the .blend file, as bpy.ops.wm.append takes it
+            return os.path.dirname(os.path.dirname(get_shape_blend(shape)))
+        return os.path.join(self.shape_dir, '%s.blend' % shape)
+
+    def load(self, shape):
+        with bpy.data.libraries.load(self.get_blend(shape)) as (data_from, data_to):
+            data_to.objects = [shape]
+        source = data_to.objects[0]
+        mesh = source.data
+        mesh.use_fake_user = True
+        # a single material slot, which every copy links to a material of its own
+        if len(mesh.materials) == 0:
+            mesh.materials.append(None)
+        self.meshes[shape] = mesh.name, source.matrix_basis.copy()
+        bpy.data.objects.remove(source)
+        self.num_loaded += 1
+
+    def new_object(self, shape, name, scale):
+        """A new object in the scene with the mesh of shape, scaled by scale in global axes
+        as bpy.ops.transform.resize scales an appended object"""
+        if shape not in self.meshes or self.meshes[shape][0] not in bpy.data.meshes:
+            self.load(shape)
+        mesh_name, matrix = self.meshes[shape]
+        obj = bpy.data.objects.new(name, bpy.data.meshes[mesh_name])
+        obj.matrix_basis = mathutils.Matrix.Diagonal(scale).to_4x4() @ matrix
+        bpy.context.collection.objects.link(obj)
+        return obj
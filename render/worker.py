@@ -0,0 +1,102 @@
+'''
+render many cases in one Blender session, with the base scene, the materials and the compositor nodes
+set up once, and only the objects of each case added and removed again
+'''
+
+import queue
+import time
+
+import bpy
+
+from render.camera import set_camera
+from render.ground import adjust_ground
+from render.objects import ObjectManager
+from render.shapes import ShapeLibrary
+from render.run_render import prepare_output, load_scene, set_output_paths, set_render_args, jitter_lights, \
+    render_case
+
+# data added by each case, removed in this order once it is rendered
+CASE_DATA = ["objects", "meshes", "materials", "node_groups", "textures", "images", "actions"]
+LAMPS = ["Lamp_Key", "Lamp_Back", "Lamp_Fill"]
+
+
+class RenderWorker(object):
+    """Renders cases one after another as run_render.main does, in the same Blender session. The scene with
+    the ground material, the materials and the compositor nodes is loaded for the first case, and again only
+    for a case with another template, base scene, material dir or shape dir, and shapes are loaded once into
+    a shape library. The objects of a case, with their materials and animation, are removed once it is
+    rendered. The time to set up each case is reported apart from the time spent rendering its images"""
+
+    def __init__(self):
+        self.scene = None
+        self.library = None
+        self.base_data = None
+        self.lamp_locations = None
+        self.mask_node = None
+        self.depth_node = None
+        self.flow_node = None
+        self.num_cases = 0
+        self.setup_time = 0.
+        self.sampling_time = 0.
+
+    def setup(self, rendering):
+        """Open the scene every case shares"""
+        self.mask_node, self.depth_node, self.flow_node = load_scene(rendering)
+        self.library = ShapeLibrary(rendering.shape_dir)
+        self.lamp_locations = {lamp: tuple(bpy.data.objects[lamp].location) for lamp in LAMPS}
+        self.base_data = {name: set(getattr(bpy.data, name).keys()) for name in CASE_DATA}
+        self.scene = self.get_scene(rendering)
+
+    @staticmethod
+    def get_scene(rendering):
+        return rendering.template_blendfile, rendering.base_scene_blendfile, rendering.material_dir, \
+               rendering.shape_dir
+
+    def clear(self):
+        """Remove everything a case added to the session, except for the meshes of the shape library"""
+        for name in CASE_DATA:
+            collection = getattr(bpy.data, name)
+            for block in list(collection):
+                if block.name not in self.base_data[name] and not block.use_fake_user:
+                    collection.remove(block)
+
+    def render(self, config):
+        rendering = config.rendering
+        start = time.time()
+        if self.scene != self.get_scene(rendering):
+            self.setup(rendering)
+        try:
+            prepare_output(rendering)
+            adjust_ground()
+            set_render_args(rendering)
+            set_camera(rendering.camera_rho, rendering.camera_theta, rendering.camera_phi,
+                       look_at=rendering.camera_look_at)
+            # jitter lamps from where the base scene has them
+            for lamp, location in self.lamp_locations.items():
+                bpy.data.objects[lamp].location = location
+            jitter_lights(rendering)
+
+            om = ObjectManager(config, rendering.shape_dir, rendering.material_dir, rendering.back_wall,
+                               library=self.library)
+            set_output_paths(rendering, self.mask_node, self.depth_node, self.flow_node)
+            setup_time = time.time() - start
+            sampling_time = render_case(config, om, self.mask_node, self.depth_node, self.flow_node)
+        finally:
+            self.clear()
+        self.num_cases += 1
+        self.setup_time += setup_time
+        self.sampling_time += sampling_time
+        print('| rendered %s, setup %.3fs, sampling %.3fs, total %.3fs' % (
+            config.case_name, setup_time, sampling_time, time.time() - start))
+
+    def run(self, configs):
+        """Render the configs of an iterable, or of a queue until it gives None"""
+        if isinstance(configs, queue.Queue):
+            configs = iter(configs.get, None)
+        for config in configs:
+            self.render(config)
+        self.log()
+
+    def log(self):
+        print('| render worker: %d cases, setup %.3fs, sampling %.3fs per case' % (
+            self.num_cases, self.setup_time / max(self.num_cases, 1), self.sampling_time / max(self.num_cases, 1)))
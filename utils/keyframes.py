@@ -0,0 +1,106 @@
+'''
+keyframe compression of motion trace arrays: each entity keeps only the records its motion bends at,
+the records in between are interpolated linearly, or by slerp for quaternions, within a max error,
+and an entity that never moves is kept as a single keyframe
+'''
+
+import numpy as np
+
+from utils.rotation import quat_slerp
+
+
+def is_spherical(name):
+    return name.endswith("_quaternion")
+
+
+def interpolate(keys, values, num_records, spherical=False):
+    """Records of shape (num_records, k) from keyframes at sorted record indices keys, with values of shape
+    (keys, k)"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(keys) <= 1:
+        return np.repeat(values, num_records, axis=0)
+    records = np.arange(num_records)
+    segment = np.clip(np.searchsorted(keys, records, side="right") - 1, 0, len(keys) - 2)
+    start, end = keys[segment], keys[segment + 1]
+    t = (records - start) / (end - start)
+    if spherical:
+        return quat_slerp(values[segment], values[segment + 1], t)
+    return values[segment] + t[:, None] * (values[segment + 1] - values[segment])
+
+
+def get_error(values, approximation, spherical=False):
+    """Largest difference of any component, quaternions q and -q being the same rotation"""
+    error = np.abs(values - approximation).max(axis=-1)
+    if spherical:
+        error = np.minimum(error, np.abs(values + approximation).max(axis=-1))
+    return error.max(initial=0)
+
+
+def select_keyframes(values, max_error, spherical=False):
+    """Record indices of the keyframes of a single entity with records of shape (records, k),
+    each segment is grown as far as it stays within max_error"""
+    values = np.asarray(values, dtype=np.float64)
+    last = len(values) - 1
+    if last <= 0 or get_error(values, values[:1], spherical) <= max_error:
+        return np.zeros(min(len(values), 1), dtype=np.int32)
+
+    def fits(start, end):
+        t = np.linspace(0, 1, end - start + 1)
+        if spherical:
+            approximation = quat_slerp(values[start], values[end], t)
+        else:
+            approximation = values[start] + t[:, None] * (values[end] - values[start])
+        return get_error(values[start:end + 1], approximation, spherical) <= max_error
+
+    keys = [0]
+    while keys[-1] < last:
+        start = keys[-1]
+        # double the segment while it fits, then bisect between the last length that fits and the first that does not
+        span = 1
+        while start + 2 * span <= last and fits(start, start + 2 * span):
+            span *= 2
+        low, high = start + span, min(start + 2 * span, last + 1)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if fits(start, middle):
+                low = middle
+            else:
+                high = middle
+        keys.append(low)
+    return np.array(keys, dtype=np.int32)
+
+
+def encode_arrays(arrays, max_error):
+    """Keyframes of every array of shape (entities, records, k), as name_keys with the record indices,
+    name_counts with the number of keyframes of each entity and name_values with their values.
+    Other arrays are kept as they are"""
+    encoded = {}
+    for name, array in arrays.items():
+        if array.ndim != 3:
+            encoded[name] = array
+            continue
+        keys = [select_keyframes(records, max_error, is_spherical(name)) for records in array]
+        encoded[name + "_keys"] = np.concatenate([np.zeros(0, dtype=np.int32)] + keys)
+        encoded[name + "_counts"] = np.array([len(k) for k in keys], dtype=np.int32)
+        encoded[name + "_values"] = np.concatenate([np.zeros((0, array.shape[2]), dtype=array.dtype)] +
+                                                   [records[k] for records, k in zip(array, keys)])
+    return encoded
+
+
+def decode_arrays(encoded, num_records):
+    """Arrays of shape (entities, records, k) from encode_arrays, with num_records[name] records each"""
+    arrays = {}
+    for name, array in encoded.items():
+        if not name.endswith("_keys"):
+            if not name.endswith("_counts") and not name.endswith("_values"):
+                arrays[name] = array
+            continue
+        name = name[:-len("_keys")]
+        values, counts = encoded[name + "_values"], encoded[name + "_counts"]
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        decoded = np.zeros((len(counts), num_records[name], values.shape[1]), dtype=values.dtype)
+        for i in range(len(counts)):
+            keys = slice(offsets[i], offsets[i + 1])
+            decoded[i] = interpolate(array[keys], values[keys], num_records[name], is_spherical(name))
+        arrays[name] = decoded
+    return arrays
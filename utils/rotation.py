@@ -0,0 +1,79 @@
+'''
+quaternions and euler angles in numpy, following the conventions of pybullet:
+quaternions are (x, y, z, w), euler angles are (roll, pitch, yaw) in radians,
+and all functions broadcast over the leading axes of their arguments
+'''
+
+import numpy as np
+
+# pitch is taken as exactly +-90 degrees beyond this, as in pybullet.getEulerFromQuaternion
+GIMBAL_LOCK_THRESHOLD = .99999
+
+
+def quat_multiply(quat_1, quat_2):
+    """Hamilton product of quaternions"""
+    x1, y1, z1, w1 = np.moveaxis(np.asarray(quat_1, dtype=np.float64), -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(np.asarray(quat_2, dtype=np.float64), -1, 0)
+    return np.stack([w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
+                     w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2,
+                     w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2], -1)
+
+
+def quat_rotate(quat, vector):
+    """Rotate vectors by unit quaternions"""
+    quat = np.asarray(quat, dtype=np.float64)
+    vector = np.asarray(vector, dtype=np.float64)
+    u, w = quat[..., :3], quat[..., 3:]
+    t = 2 * np.cross(u, vector)
+    return vector + w * t + np.cross(u, t)
+
+
+def quat_from_axis_angle(axis, angle):
+    """Quaternions of rotations by angles about a unit axis"""
+    half = np.asarray(angle, dtype=np.float64)[..., None] / 2
+    return np.concatenate([np.sin(half) * np.asarray(axis, dtype=np.float64), np.cos(half)], -1)
+
+
+def quat_from_euler(euler):
+    """Quaternions of euler angles, as pybullet.getQuaternionFromEuler"""
+    roll, pitch, yaw = np.moveaxis(np.asarray(euler, dtype=np.float64) / 2, -1, 0)
+    cos_r, sin_r = np.cos(roll), np.sin(roll)
+    cos_p, sin_p = np.cos(pitch), np.sin(pitch)
+    cos_y, sin_y = np.cos(yaw), np.sin(yaw)
+    return np.stack([sin_r * cos_p * cos_y - cos_r * sin_p * sin_y,
+                     cos_r * sin_p * cos_y + sin_r * cos_p * sin_y,
+                     cos_r * cos_p * sin_y - sin_r * sin_p * cos_y,
+                     cos_r * cos_p * cos_y + sin_r * sin_p * sin_y], -1)
+
+
+def euler_from_quat(quat):
+    """Euler angles of quaternions, as pybullet.getEulerFromQuaternion,
+    at a pitch of +-90 degrees roll is 0 and yaw takes the whole rotation about z"""
+    x, y, z, w = np.moveaxis(np.asarray(quat, dtype=np.float64), -1, 0)
+    sin_pitch = -2 * (x * z - w * y)
+    roll = np.arctan2(2 * (y * z + w * x), w * w - x * x - y * y + z * z)
+    pitch = np.arcsin(np.clip(sin_pitch, -1, 1))
+    yaw = np.arctan2(2 * (x * y + w * z), w * w + x * x - y * y - z * z)
+    low, high = sin_pitch <= -GIMBAL_LOCK_THRESHOLD, sin_pitch >= GIMBAL_LOCK_THRESHOLD
+    roll = np.where(low | high, 0., roll)
+    pitch = np.where(low, -np.pi / 2, np.where(high, np.pi / 2, pitch))
+    yaw = np.where(low, 2 * np.arctan2(x, -y), np.where(high, 2 * np.arctan2(-x, y), yaw))
+    return np.stack([roll, pitch, yaw], -1)
+
+
+def quat_slerp(quat_1, quat_2, t):
+    """Spherical linear interpolation from quat_1 to quat_2 at fractions t, along the shorter arc"""
+    quat_1 = np.asarray(quat_1, dtype=np.float64)
+    quat_2 = np.asarray(quat_2, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    dot = np.sum(quat_1 * quat_2, -1, keepdims=True)
+    quat_2 = np.where(dot < 0, -quat_2, quat_2)
+    angle = np.arccos(np.clip(np.abs(dot), 0, 1))
+    sin_angle = np.sin(angle)
+    # nearly equal quaternions are interpolated linearly
+    near = sin_angle < 1e-6
+    safe = np.where(near, 1., sin_angle)
+    weight_1 = np.where(near, 1 - t, np.sin((1 - t) * angle) / safe)
+    weight_2 = np.where(near, t, np.sin(t * angle) / safe)
+    return weight_1 * quat_1 + weight_2 * quat_2
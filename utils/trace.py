@@ -0,0 +1,275 @@
+'''
+columnar motion traces, stored as one float32 array of shape (steps, 3) per entity and field,
+steps at which nothing of a group moves are stored once with the length of their run,
+orientations are stored as quaternions and converted to euler angles only when they are read,
+long traces can be written and read in chunks of consecutive steps
+'''
+
+import argparse
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from utils.keyframes import encode_arrays, decode_arrays
+from utils.rotation import euler_from_quat, quat_from_euler
+
+TRACE_VERSION = 3
+GROUPS = ("objects", "occluders", "desks")
+FIELDS = ("location", "orientation", "velocity", "angular_velocity")
+# fields written by the simulation, quaternions are (x, y, z, w) as in pybullet
+STORED_FIELDS = ("location", "quaternion", "velocity", "angular_velocity")
+FIELD_SIZES = dict(location=3, orientation=3, quaternion=4, velocity=3, angular_velocity=3)
+DESK_PARTS = 5
+
+
+class MotionTrace(object):
+    """Motion of every entity in a scene, with arrays[group_field] of shape (entities, records, 3),
+    or (entities, records, 4) for quaternions. Either orientation or quaternion is stored, the other one is
+    derived from it when it is read. If arrays[group_runs] exists, each record of the group holds for that many
+    steps, otherwise for one. Desks are flattened into DESK_PARTS entities each, in the order of
+    ObjectManager.add_desk. Step n of the trace is physics step n * record_every of the simulation"""
+
+    def __init__(self, header, arrays):
+        self.header = header
+        self.arrays = arrays
+        self.record_index = {}
+        self.derived = {}
+
+    @property
+    def timestep(self):
+        return self.header["timestep"]
+
+    @property
+    def num_steps(self):
+        return self.header["num_steps"]
+
+    @property
+    def record_every(self):
+        """Number of physics steps of timestep between two recorded steps"""
+        return self.header.get("record_every", 1)
+
+    def count(self, group):
+        """Number of entities in a group, desks count as DESK_PARTS entities"""
+        return self.header["counts"][group] * (DESK_PARTS if group == "desks" else 1)
+
+    def runs(self, group):
+        """Number of steps each record of a group holds for"""
+        key = "{}_runs".format(group)
+        if key in self.arrays:
+            return self.arrays[key]
+        return np.ones(self.arrays["{}_{}".format(group, FIELDS[0])].shape[1], dtype=np.int32)
+
+    def get_record_index(self, group):
+        """Index of the record of a group at each step"""
+        if group not in self.record_index:
+            runs = self.runs(group)
+            self.record_index[group] = np.repeat(np.arange(len(runs)), runs)
+        return self.record_index[group]
+
+    def records(self, group, field):
+        """Array of shape (entities, records, 3) of a single group, before expanding the runs"""
+        key = "{}_{}".format(group, field)
+        if key in self.arrays:
+            return self.arrays[key]
+        if key not in self.derived:
+            if field == "orientation":
+                self.derived[key] = euler_from_quat(self.arrays["{}_quaternion".format(group)])
+            elif field == "quaternion":
+                self.derived[key] = quat_from_euler(self.arrays["{}_orientation".format(group)])
+            else:
+                raise KeyError(key)
+        return self.derived[key]
+
+    def group(self, group, field):
+        """Array of shape (entities, steps, 3) of a single group"""
+        values = self.records(group, field)
+        if "{}_runs".format(group) not in self.arrays:
+            return values
+        return np.repeat(values, self.runs(group), axis=1)
+
+    def entities(self, field):
+        """Array of shape (entities, steps, 3) of all groups, objects before occluders before desks,
+        which is the order of names in render.objects.ObjectManager"""
+        return np.concatenate([self.group(group, field) for group in GROUPS], axis=0)
+
+    def entity_motion(self, group, index, step):
+        """Motion dict of a single entity at a single step, as in the json motion file"""
+        record = self.get_record_index(group)[step]
+        return {field: self.records(group, field)[index, record].tolist() for field in FIELDS}
+
+    def frame(self, step):
+        """Motion of all entities at a single step, as in the json motion file"""
+        objects = [self.entity_motion("objects", i, step) for i in range(self.count("objects"))]
+        occluders = [self.entity_motion("occluders", i, step) for i in range(self.count("occluders"))]
+        desk_parts = [self.entity_motion("desks", i, step) for i in range(self.count("desks"))]
+        desks = [desk_parts[i:i + DESK_PARTS] for i in range(0, len(desk_parts), DESK_PARTS)]
+        return dict(objects=objects, occluders=occluders, desks=desks)
+
+    def to_motion(self):
+        """Convert to the list of per step dicts of the json motion file"""
+        return [self.frame(step) for step in range(self.num_steps)]
+
+    @classmethod
+    def from_motion(cls, timestep, motion, record_every=1):
+        """Convert from the list of per step dicts of the json motion file,
+        a step that reuses the list of a group from the previous step continues its run"""
+        num_steps = len(motion)
+        counts = dict(objects=0, occluders=0, desks=0)
+        if num_steps > 0:
+            counts = {group: len(motion[0][group]) for group in GROUPS}
+        header = dict(version=TRACE_VERSION, timestep=timestep, num_steps=num_steps, record_every=record_every,
+                      counts=counts)
+        arrays = {}
+        for group in GROUPS:
+            records, runs = [], []
+            for i, m in enumerate(motion):
+                if i > 0 and m[group] is motion[i - 1][group]:
+                    runs[-1] += 1
+                else:
+                    records.append(m[group])
+                    runs.append(1)
+            if group == "desks":
+                records = [[part for desk in record for part in desk] for record in records]
+            n = counts[group] * (DESK_PARTS if group == "desks" else 1)
+            for field in FIELDS:
+                values = np.array([[e[field] for e in record] for record in records], dtype=np.float32)
+                arrays["{}_{}".format(group, field)] = values.reshape(len(records), n, 3).transpose(1, 0, 2)
+            if len(records) < num_steps:
+                arrays["{}_runs".format(group)] = np.array(runs, dtype=np.int32)
+        return cls(header, arrays)
+
+
+def get_stored_arrays(arrays):
+    """Arrays as written to .npz, runs as int32 and fields as float32"""
+    return {k: np.ascontiguousarray(v, dtype=np.int32 if k.endswith("_runs") else np.float32)
+            for k, v in arrays.items()}
+
+
+class TraceWriter(object):
+    """Writes a motion trace to .npz one chunk of consecutive steps at a time, as arrays name.chunk of each chunk,
+    into a temporary file that replaces file_name once it is closed"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        # files being written start with a dot
+        self.temp_file = os.path.join(os.path.dirname(file_name), "." + os.path.basename(file_name))
+        self.zip_file = zipfile.ZipFile(self.temp_file, "w", allowZip64=True)
+        self.chunk_steps = []
+
+    def write_array(self, name, array):
+        with self.zip_file.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, array)
+
+    def write_chunk(self, arrays, num_steps):
+        """Append the arrays of the next num_steps steps, with runs that end within the chunk"""
+        for name, array in get_stored_arrays(arrays).items():
+            self.write_array("{}.{:05d}".format(name, len(self.chunk_steps)), array)
+        self.chunk_steps.append(num_steps)
+
+    def close(self, header):
+        """Write the header of the whole trace and move the file in place"""
+        header = dict(header, num_steps=sum(self.chunk_steps), chunks=self.chunk_steps)
+        self.write_array("header", np.array(json.dumps(header)))
+        self.zip_file.close()
+        os.replace(self.temp_file, self.file_name)
+
+    def discard(self):
+        self.zip_file.close()
+        os.remove(self.temp_file)
+
+
+def iter_trace(file_name):
+    """Read a motion trace one chunk at a time, as a MotionTrace of the steps of each chunk
+    with header first_step, the step of the whole trace it starts at.
+    A trace that was not written in chunks is read as a single chunk"""
+    if not file_name.endswith(".npz"):
+        yield read_trace(file_name)
+        return
+    with np.load(file_name) as data:
+        header = json.loads(str(data["header"]))
+        if "chunks" not in header:
+            yield read_trace(file_name)
+            return
+        # arrays are named name.chunk
+        names = {}
+        for k in data.files:
+            name, _, chunk = k.rpartition(".")
+            if name:
+                names.setdefault(int(chunk), []).append(name)
+        first_step = 0
+        for i, num_steps in enumerate(header.pop("chunks")):
+            arrays = {name: data["{}.{:05d}".format(name, i)] for name in names.get(i, [])}
+            yield MotionTrace(dict(header, num_steps=num_steps, first_step=first_step), arrays)
+            first_step += num_steps
+
+
+def concatenate_traces(chunks):
+    """Single trace of consecutive chunks, as read by iter_trace"""
+    header = dict(chunks[0].header, num_steps=sum(chunk.num_steps for chunk in chunks))
+    header.pop("first_step", None)
+    arrays = {}
+    for name in chunks[0].arrays:
+        if not name.endswith("_runs"):
+            arrays[name] = np.concatenate([chunk.arrays[name] for chunk in chunks], axis=1)
+    for group in GROUPS:
+        runs = np.concatenate([chunk.runs(group) for chunk in chunks])
+        if len(runs) < header["num_steps"]:
+            arrays["{}_runs".format(group)] = runs
+    return MotionTrace(header, arrays)
+
+
+def write_trace(trace, file_name, max_error=None):
+    """Write a motion trace to .npz, or to the legacy .json motion file.
+    With max_error, the .npz file keeps only the keyframes each entity can be interpolated from within max_error"""
+    if file_name.endswith(".npz"):
+        arrays = get_stored_arrays(trace.arrays)
+        header = trace.header
+        if max_error is not None:
+            num_records = {k: v.shape[1] for k, v in arrays.items() if v.ndim == 3}
+            header = dict(header, keyframes=dict(max_error=max_error, num_records=num_records))
+            arrays = encode_arrays(arrays, max_error)
+        np.savez(file_name, header=np.array(json.dumps(header)), **arrays)
+    elif file_name.endswith(".json"):
+        with open(file_name, "w") as f:
+            json.dump(dict(timestep=trace.timestep, record_every=trace.record_every, motion=trace.to_motion()),
+                      f, indent=4)
+    else:
+        raise FileNotFoundError
+
+
+def read_trace(file_name):
+    """Read a motion trace from .npz, or from the legacy .json motion file"""
+    if file_name.endswith(".npz"):
+        with np.load(file_name) as data:
+            header = json.loads(str(data["header"]))
+            if "chunks" in header:
+                return concatenate_traces(list(iter_trace(file_name)))
+            arrays = {k: data[k] for k in data.files if k != "header"}
+        if "keyframes" in header:
+            arrays = decode_arrays(arrays, header.pop("keyframes")["num_records"])
+        return MotionTrace(header, arrays)
+    elif file_name.endswith(".json"):
+        with open(file_name, "r") as f:
+            input_file = json.load(f)
+        return MotionTrace.from_motion(float(input_file["timestep"]), input_file["motion"],
+                                       int(input_file.get("record_every", 1)))
+    else:
+        raise FileNotFoundError
+
+
+def convert_motion_file(motion_file, output_file=None):
+    """Convert a legacy motion.json file to motion.npz"""
+    if output_file is None:
+        output_file = os.path.splitext(motion_file)[0] + ".npz"
+    write_trace(read_trace(motion_file), output_file)
+    return output_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("motion_files", nargs="+", type=str, help="motion.json files to convert")
+    args = parser.parse_args()
+    for motion_file in args.motion_files:
+        print('| converting {} to {}'.format(motion_file, convert_motion_file(motion_file)))